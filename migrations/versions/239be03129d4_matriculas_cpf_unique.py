@@ -0,0 +1,29 @@
+"""matriculas: cpf unique (arbiter do upsert em /matricula/gerar)
+
+Revision ID: 239be03129d4
+Revises: f91c7cf8629a
+Create Date: 2026-10-16 09:10:00.000000
+
+Obs.: falha se já houver CPFs duplicados em 'matriculas' — deduplique antes.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "239be03129d4"
+down_revision = "f91c7cf8629a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("matriculas", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_matriculas_cpf"))
+        batch_op.create_index(batch_op.f("ix_matriculas_cpf"), ["cpf"], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table("matriculas", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_matriculas_cpf"))
+        batch_op.create_index(batch_op.f("ix_matriculas_cpf"), ["cpf"], unique=False)
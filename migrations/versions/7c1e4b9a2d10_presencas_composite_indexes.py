@@ -0,0 +1,29 @@
+"""presencas: índice composto (date_key, timestamp) p/ listagem e exports
+
+Revision ID: 7c1e4b9a2d10
+Revises: 239be03129d4
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "7c1e4b9a2d10"
+down_revision = "239be03129d4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("presencas", schema=None) as batch_op:
+        # filtro por matrícula + dia fica com uq_presenca_por_dia (a4d2f6c8e913)
+        batch_op.create_index(
+            "ix_presencas_date_key_ts", ["date_key", "timestamp"], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("presencas", schema=None) as batch_op:
+        batch_op.drop_index("ix_presencas_date_key_ts")
@@ -0,0 +1,32 @@
+"""presencas: volta o unique (matricula_id, date_key) — 1 presença por dia
+
+Revision ID: a4d2f6c8e913
+Revises: 7c1e4b9a2d10
+Create Date: 2026-10-16 11:00:00.000000
+
+Obs.: remove duplicatas do mesmo dia (mantém o menor id) antes de criar a constraint.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a4d2f6c8e913"
+down_revision = "7c1e4b9a2d10"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "DELETE FROM presencas WHERE id NOT IN ("
+        " SELECT MIN(id) FROM presencas GROUP BY matricula_id, date_key"
+        ")"
+    )
+    with op.batch_alter_table("presencas", schema=None) as batch_op:
+        batch_op.create_unique_constraint("uq_presenca_por_dia", ["matricula_id", "date_key"])
+
+
+def downgrade():
+    with op.batch_alter_table("presencas", schema=None) as batch_op:
+        batch_op.drop_constraint("uq_presenca_por_dia", type_="unique")
@@ -0,0 +1,31 @@
+"""presencas: remove índices redundantes (prefixos de uq_presenca_por_dia / ix_presencas_date_key_ts)
+
+Revision ID: b7e19c3d5f20
+Revises: a4d2f6c8e913
+Create Date: 2026-10-16 12:00:00.000000
+
+- ix_presencas_matricula_id: prefixo de uq_presenca_por_dia (matricula_id, date_key).
+- ix_presencas_date_key: prefixo de ix_presencas_date_key_ts (date_key, timestamp).
+Menos índices para manter a cada INSERT de presença.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b7e19c3d5f20"
+down_revision = "a4d2f6c8e913"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("presencas", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_presencas_matricula_id"))
+        batch_op.drop_index(batch_op.f("ix_presencas_date_key"))
+
+
+def downgrade():
+    with op.batch_alter_table("presencas", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_presencas_date_key"), ["date_key"], unique=False)
+        batch_op.create_index(batch_op.f("ix_presencas_matricula_id"), ["matricula_id"], unique=False)
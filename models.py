@@ -45,22 +45,32 @@ class Matricula(db.Model):
     __tablename__ = "matriculas"
     id = db.Column(db.BigInteger, primary_key=True)
     code = db.Column(db.String(8), nullable=False, unique=True, index=True)  # ex.: MR41081
-    cpf = db.Column(db.String(11), nullable=False, index=True)
+    cpf = db.Column(db.String(11), nullable=False, unique=True, index=True)  # 1 matrícula por CPF
     holder_name = db.Column(db.String(120))
     birth_date = db.Column(db.String(10))  # "YYYY-MM-DD"
-    status = db.Column(db.String(20), default="active")
+    status = db.Column(db.String(20), default="active", server_default="active")
     created_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False)
 
 class Presenca(db.Model):
     __tablename__ = "presencas"
     id = db.Column(db.BigInteger, primary_key=True)
-    matricula_id = db.Column(db.BigInteger, db.ForeignKey("matriculas.id"), nullable=False, index=True)
-    date_key = db.Column(db.Date, nullable=False, index=True)  # 1x por dia
+    matricula_id = db.Column(db.BigInteger, db.ForeignKey("matriculas.id"), nullable=False)
+    date_key = db.Column(db.Date, nullable=False)  # 1x por dia
     timestamp = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False)
     ip = db.Column(db.String(64))
     user_agent = db.Column(db.String(300))
     source = db.Column(db.String(20), default="web")
 
+    # Índices (os de coluna única seriam prefixos redundantes destes):
+    #  - uq_presenca_por_dia: 1 presença/matrícula/dia (árbitro do ON CONFLICT) e
+    #    filtro por matrícula + date_key (FK e /presenca/api?matricula=...)
+    #  - ix_presencas_date_key_ts: intervalo de datas ordenado por
+    #    (date_key DESC, timestamp DESC) nos exports — varredura reversa, sem Sort
+    __table_args__ = (
+        db.UniqueConstraint("matricula_id", "date_key", name="uq_presenca_por_dia"),
+        db.Index("ix_presencas_date_key_ts", "date_key", "timestamp"),
+    )
+
 class EventCheckin(db.Model):
     __tablename__ = "event_checkins"
     id = db.Column(db.BigInteger, primary_key=True)
@@ -1,6 +1,4 @@
 # modules/checkin/routes.py
-import csv
-import io
 import re
 import datetime as _dt
 from zoneinfo import ZoneInfo
@@ -8,8 +6,9 @@ from zoneinfo import ZoneInfo
 from flask import (
     Blueprint, request, render_template, redirect, url_for, flash, Response, jsonify
 )
-from sqlalchemy import desc
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import desc, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 # Use UMA única origem de modelos. Primeiro tenta 'models', se falhar usa 'yourapp.models'.
 try:
@@ -17,15 +16,21 @@ try:
 except ImportError:
     from yourapp.models import db, EventCheckin, Matricula
 
+from modules.utils.export import csv_response
+
 # Defina o blueprint UMA vez só, com prefixo
 checkin_bp = Blueprint("checkin", __name__, url_prefix="/checkin")
 
 _ONLY_DIGITS = re.compile(r"\D+")
+# Tabela p/ str.translate: descarta todo ASCII que não é dígito
+_DROP_NON_DIGITS = str.maketrans("", "", "".join(chr(c) for c in range(128) if not 48 <= c <= 57))
 
 
 # ======================== Helpers ========================
 def _only_digits(s: str) -> str:
-    return _ONLY_DIGITS.sub("", s or "")
+    if not s:
+        return ""
+    return s.translate(_DROP_NON_DIGITS) if s.isascii() else _ONLY_DIGITS.sub("", s)
 
 
 def _cpf_is_valid(cpf_raw: str) -> bool:
@@ -106,28 +111,26 @@ def checkin_submit():
 
     # (Opcional) Checagem na base de multiplicadores
     # Se existir Matricula com mesmo CPF e birth_date preenchida, exige match:
-    m = Matricula.query.filter_by(cpf=cpf).first()
-    if m and m.birth_date and m.birth_date != birth_iso:
+    m_birth = db.session.scalar(select(Matricula.birth_date).where(Matricula.cpf == cpf))
+    if m_birth and m_birth != birth_iso:
         flash("Data de nascimento não confere com a base de multiplicadores.", "error")
         return redirect(url_for("checkin.checkin_page", event=event_date.isoformat()))
 
-    # Upsert por (event_date, cpf)
-    existing = EventCheckin.query.filter_by(event_date=event_date, cpf=cpf).first()
-    if existing:
-        existing.birth_date = birth_iso
-        db.session.commit()
+    # Upsert por (event_date, cpf) num único statement (sem janela de corrida):
+    # ON CONFLICT DO UPDATE só atualiza birth_date/updated_at do check-in existente
+    insert = pg_insert if db.session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(EventCheckin).values(event_date=event_date, cpf=cpf, birth_date=birth_iso)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[EventCheckin.event_date, EventCheckin.cpf],
+        set_={"birth_date": stmt.excluded.birth_date, "updated_at": func.now()},
+    ).returning(EventCheckin.created_at, EventCheckin.updated_at)
+    row = db.session.execute(stmt).one()
+    db.session.commit()
+
+    # linha recém-criada: created_at == updated_at (mesmo now() do INSERT)
+    if row.created_at != row.updated_at:
         flash("Check-in já existia e foi atualizado. ✅", "success")
-        return redirect(url_for("checkin.checkin_success", event=event_date.isoformat()))
-
-    try:
-        db.session.add(EventCheckin(event_date=event_date, cpf=cpf, birth_date=birth_iso))
-        db.session.commit()
-        return redirect(url_for("checkin.checkin_success", event=event_date.isoformat()))
-    except IntegrityError:
-        # Conflito de unique (concorrência): confirma como sucesso
-        db.session.rollback()
-        flash("Este CPF já realizou o check-in para esta data. ✅", "success")
-        return redirect(url_for("checkin.checkin_success", event=event_date.isoformat()))
+    return redirect(url_for("checkin.checkin_success", event=event_date.isoformat()))
 
 
 @checkin_bp.get("/sucesso")
@@ -149,56 +152,49 @@ def checkin_list():
     return render_template("checkin/list.html", event_date=event_date, rows=rows)
 
 
-@checkin_bp.get("/csv")
 @checkin_bp.get("/csv")
 def checkin_csv():
     """
     Exporta CSV dos check-ins de uma data (ou hoje se não informado).
+    Linhas saem em streaming (cursor do lado do servidor no Postgres).
     """
-    # 1) defina event_date primeiro
     event_date = _parse_event_date()
 
-    # 2) carregue as linhas do banco
-    rows = (
-        EventCheckin.query
-        .filter_by(event_date=event_date)
+    stmt = (
+        select(EventCheckin.event_date, EventCheckin.cpf, EventCheckin.birth_date,
+               EventCheckin.created_at, EventCheckin.updated_at)
+        .where(EventCheckin.event_date == event_date)
         .order_by(EventCheckin.created_at.asc())
-        .all()
+        .execution_options(stream_results=True, yield_per=500)
     )
 
-    # 3) crie o buffer e o writer ANTES de usar
-    buf = io.StringIO()
-    w = csv.writer(buf)
-
-    # 4) cabeçalho
-    w.writerow(["event_date", "cpf", "birth_date", "created_at_brt", "updated_at_brt"])
-
-    # 5) escreva as linhas (normalizando timezone)
+    # normaliza timezone (assume UTC se datetime vier "naive")
+    # (nomes ligados 1x: _brt roda 2x por linha do export)
     tz = ZoneInfo("America/Sao_Paulo")
-    for r in rows:
-        ca = r.created_at
-        ua = r.updated_at
-        # assume UTC se datetime vier "naive"
-        if ca and ca.tzinfo is None:
-            ca = ca.replace(tzinfo=_dt.timezone.utc)
-        if ua and ua.tzinfo is None:
-            ua = ua.replace(tzinfo=_dt.timezone.utc)
-
-        w.writerow([
-            r.event_date.isoformat() if r.event_date else "",
-            r.cpf,
-            r.birth_date or "",
-            ca.astimezone(tz).strftime("%Y-%m-%d %H:%M:%S") if ca else "",
-            ua.astimezone(tz).strftime("%Y-%m-%d %H:%M:%S") if ua else "",
-        ])
-
-    # 6) finalize e retorne
-    out = buf.getvalue().encode("utf-8")
-    return Response(
-        out,
-        mimetype="text/csv; charset=utf-8",
-        headers={"Content-Disposition": f"attachment; filename=checkins_{event_date.isoformat()}.csv"}
+    utc = _dt.timezone.utc
+
+    def _brt(v):
+        if not v:
+            return ""
+        if v.tzinfo is None:
+            v = v.replace(tzinfo=utc)
+        return v.astimezone(tz).strftime("%Y-%m-%d %H:%M:%S")
+
+    rows = ((
+        r.event_date.isoformat() if r.event_date else "",
+        r.cpf,
+        r.birth_date or "",
+        _brt(r.created_at),
+        _brt(r.updated_at),
+    ) for r in db.session.execute(stmt))
+
+    return csv_response(
+        ["event_date", "cpf", "birth_date", "created_at_brt", "updated_at_brt"],
+        rows,
+        f"checkins_{event_date.isoformat()}.csv",
     )
+
+
 @checkin_bp.get("/api")
 def checkin_api_get():
     """
@@ -226,11 +222,10 @@ def checkin_api_get():
     _from = request.args.get("from")
     _to = request.args.get("to")
 
-    from datetime import datetime
     if _from:
-        q = q.filter(EventCheckin.created_at >= datetime.fromisoformat(_from))
+        q = q.filter(EventCheckin.created_at >= _dt.datetime.fromisoformat(_from))
     if _to:
-        q = q.filter(EventCheckin.created_at <= datetime.fromisoformat(_to))
+        q = q.filter(EventCheckin.created_at <= _dt.datetime.fromisoformat(_to))
 
     q = q.order_by(desc(EventCheckin.created_at))
 
@@ -239,9 +234,9 @@ def checkin_api_get():
         "id": c.id,
         "cpf": c.cpf,
         "birth_date": c.birth_date,
-        "event_date": c.event_date.isoformat() if c.event_date else None,
-        "created_at": c.created_at.isoformat() if c.created_at else None,
-        "updated_at": c.updated_at.isoformat() if c.updated_at else None,
+        "event_date": c.event_date,   # date/datetime: o provider JSON (orjson)
+        "created_at": c.created_at,   # serializa em ISO 8601
+        "updated_at": c.updated_at,
     } for c in items.items]
 
     return jsonify(
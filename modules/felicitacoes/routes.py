@@ -1,13 +1,38 @@
 from flask import Blueprint, request, jsonify, current_app
 from datetime import datetime
 from zoneinfo import ZoneInfo
+import os
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from modules.utils.http import json_body
 
 felicitacoes_bp = Blueprint("felicitacoes", __name__)
 
 # ---------- Helpers ----------
 TZ = ZoneInfo("America/Sao_Paulo")
 
+# Sessão HTTP por processo: reaproveita a conexão TLS com a API do WhatsApp
+# (keep-alive) em vez de abrir uma nova a cada mensagem da lista
+_SESSION = None
+_SESSION_PID = None
+_SESSION_LOCK = threading.Lock()
+
+def _http_session() -> requests.Session:
+    """Session criada na 1ª chamada de cada processo (sockets não atravessam o fork do gunicorn)."""
+    global _SESSION, _SESSION_PID
+    with _SESSION_LOCK:
+        if _SESSION is None or _SESSION_PID != os.getpid():
+            s = requests.Session()
+            # Retry só refaz falhas de conexão: POST não é reenviado após resposta 5xx
+            # (não duplica mensagem), já que POST fica fora de allowed_methods
+            retry = Retry(total=2, backoff_factor=0.1, status_forcelist=[502, 503, 504])
+            s.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=retry))
+            _SESSION, _SESSION_PID = s, os.getpid()
+        return _SESSION
+
 def _parse_dt_any(s: str | None):
     """Tenta parsear várias formas de data. Retorna (dia, mes) ou None."""
     if not s:
@@ -28,13 +53,10 @@ def _parse_dt_any(s: str | None):
             pass
     return None
 
-def _is_birthday_today(date_str: str | None) -> bool:
+def _is_birthday_today(date_str: str | None, today_dm: tuple[int, int]) -> bool:
+    """today_dm = (dia, mês) de hoje, lido 1x por requisição por quem chama."""
     dm = _parse_dt_any(date_str)
-    if not dm:
-        return False
-    d, m = dm
-    now = datetime.now(TZ)
-    return (d == now.day and m == now.month)
+    return dm is not None and dm == today_dm
 
 def _compose_message(nome: str) -> str:
     nome_fmt = (nome or "").strip().title()
@@ -66,9 +88,15 @@ def _send_whatsapp(telefone: str, texto: str):
         "type": "text",
         "text": {"body": texto},
     }
-    resp = requests.post(url, json=body, headers=headers, timeout=30)
+    # timeout separado: conectar (3s) / ler resposta (30s)
+    resp = _http_session().post(url, json=body, headers=headers, timeout=(3.05, 30))
     ok = 200 <= resp.status_code < 300
-    data = resp.json() if "application/json" in (resp.headers.get("Content-Type") or "") else resp.text
+    # provider JSON da app (orjson quando disponível) direto nos bytes da resposta,
+    # em vez do resp.json() (json padrão + decode do texto)
+    if "application/json" in (resp.headers.get("Content-Type") or ""):
+        data = current_app.json.loads(resp.content)
+    else:
+        data = resp.text
     return ok, resp.status_code, data
 
 # ---------- Endpoint para o Workato ----------
@@ -96,7 +124,7 @@ def disparar_aniversario():
     Query:
     - ?dry_run=1  -> não envia, só simula
     """
-    payload = request.get_json(silent=True) or {}
+    payload = json_body() or {}
     dry_run = (request.args.get("dry_run", "0") in {"1", "true", "yes"})
 
     # Normaliza para lista
@@ -109,7 +137,8 @@ def disparar_aniversario():
     else:
         return jsonify({"status": "error", "message": "Formato inválido. Envie objeto único, lista, ou {\"itens\": [...]}."}), 400
 
-    today_dm = (datetime.now(TZ).day, datetime.now(TZ).month)
+    now = datetime.now(TZ)  # 1 leitura do relógio p/ toda a lista
+    today_dm = (now.day, now.month)
     sent, skipped, errors = 0, 0, 0
     details = []
 
@@ -124,7 +153,7 @@ def disparar_aniversario():
             continue
 
         # Se não é hoje, pula
-        if not _is_birthday_today(nascimento):
+        if not _is_birthday_today(nascimento, today_dm):
             skipped += 1
             details.append({"idx": idx, "status": "skipped", "reason": "não é aniversário hoje"})
             continue
@@ -1,68 +1,166 @@
 # modules/matricula/routes.py
-import re, io, csv, hmac, hashlib
+import re, hashlib
 import datetime as _dt
 
 from flask import (
-    Blueprint, request, jsonify, Response, current_app, render_template
+    Blueprint, request, jsonify, Response, current_app, g, has_request_context
 )
+from sqlalchemy import and_, case, event, exists, func, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from app import cache
 from models import db, Matricula
+from modules.utils.export import copy_csv_response, copy_supported, csv_response
+from modules.utils.http import small_json_body
+from modules.utils.matriculas import lookup_matricula, forget_matricula, normalize_code
+from modules.utils.pages import keyed_page, render_page, static_page
 
 # -------------------------------------------------------------------
 # Blueprint
 # -------------------------------------------------------------------
 matricula_bp = Blueprint("matricula", __name__, url_prefix="/matricula")
 
-# Padrão MR + 5 dígitos
-FORMAT = re.compile(r"^MR\d{5}$")
-
-# Aceita somente DD/MM/AAAA
-DATE_RE = re.compile(r"^\d{2}/\d{2}/\d{4}$")
-
 # ======================== Funções auxiliares ========================
+_NON_DIGIT_RE = re.compile(r"\D+")
+# Tabela p/ str.translate: descarta todo ASCII que não é dígito
+_DROP_NON_DIGITS = str.maketrans("", "", "".join(chr(c) for c in range(128) if not 48 <= c <= 57))
+
 def _only_digits(s: str) -> str:
-    """Remove tudo que não for número."""
-    return re.sub(r"\D+", "", s or "")
+    """Remove tudo que não for número (translate no caso ASCII, regex no resto)."""
+    if not s:
+        return ""
+    return s.translate(_DROP_NON_DIGITS) if s.isascii() else _NON_DIGIT_RE.sub("", s)
 
 def _is_valid_cpf_digits(d: str) -> bool:
-    """Valida se o CPF contém exatamente 11 dígitos numéricos."""
-    d = _only_digits(d)
+    """
+    Valida se o CPF contém exatamente 11 dígitos numéricos.
+    Espera o valor já limpo por _only_digits (os callers sempre limpam antes).
+    """
     return len(d) == 11 and d.isdigit()
 
+# 'YYYY-MM-DD' ou 'DD/MM/YYYY' (dia/mês com 1 ou 2 dígitos, como o strptime aceitava)
+_BIRTH_RE = re.compile(r"\A(?:(\d{4})-(\d{1,2})-(\d{1,2})|(\d{1,2})/(\d{1,2})/(\d{4}))\Z", re.ASCII)
+
 def _parse_birth_date(s: str):
     """
     Converte string para date.
     Aceita 'YYYY-MM-DD' (ISO) ou 'DD/MM/YYYY'.
     Retorna None se formato inválido.
     """
-    import datetime as _dt
-
     if not s:
         return None
 
-    s = s.strip()
-    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
-        try:
-            return _dt.datetime.strptime(s, fmt).date()
-        except ValueError:
-            continue
-    return None
+    m = _BIRTH_RE.match(s.strip())
+    if not m:
+        return None
+    y, mo, d = (m[1], m[2], m[3]) if m[1] else (m[6], m[5], m[4])
+    try:
+        return _dt.date(int(y), int(mo), int(d))
+    except ValueError:  # ex.: 31/02/2001
+        return None
+
 
+def _birth_iso(value):
+    """Converte birth_date (date | str | None) para ISO 'YYYY-MM-DD'."""
+    if not value:
+        return None
+    if isinstance(value, _dt.date):
+        return value.isoformat()
+    # Coluna String(10): o que é gravado via _parse_birth_date já sai ISO
+    s = str(value).strip()
+    return s if len(s) == 10 and s[4] == "-" and s[7] == "-" else None
+
+def _json_matricula(m):
+    """Serialização padrão de uma Matricula nas respostas JSON."""
+    return {
+        "code": m.code,
+        "cpf": m.cpf,
+        "birth_date": _birth_iso(m.birth_date),
+        "holder_name": m.holder_name,
+        "status": m.status,
+    }
+
+# Parâmetros do código (lidos 1x no registro do blueprint; ver _load_code_config)
+_SALT_BYTES = b"salt-fixo-para-matricula"
+_DIGITS = 5
+_PREFIX = "MR"
+_MODULUS = 10 ** _DIGITS
+# Hash já inicializado com a chave; cada chamada só faz .copy() + .update()
+_KEYED_HASH = hashlib.blake2b(key=_SALT_BYTES, digest_size=8)
+# Tabela com todos os códigos pré-formatados (só p/ até 5 dígitos, ~100k itens)
+_CODE_LUT = None
+
+@matricula_bp.record_once
+def _load_code_config(state):
+    """Lê MATRICULA_SALT/DIGITS/PREFIX do app uma única vez."""
+    global _SALT_BYTES, _DIGITS, _PREFIX, _MODULUS, _KEYED_HASH, _CODE_LUT
+    cfg = state.app.config
+    # blake2b aceita chave de até 64 bytes
+    _SALT_BYTES = (cfg.get("MATRICULA_SALT") or "salt-fixo-para-matricula").encode()[:64]
+    _DIGITS = int(cfg.get("MATRICULA_DIGITS", 5))
+    _PREFIX = cfg.get("MATRICULA_PREFIX", "MR")
+    _MODULUS = 10 ** _DIGITS
+    _KEYED_HASH = hashlib.blake2b(key=_SALT_BYTES, digest_size=8)
+    if _DIGITS <= 5:
+        _CODE_LUT = tuple(f"{_PREFIX}{i:0{_DIGITS}d}" for i in range(_MODULUS))
 
 def _code_from_cpf(cpf_digits: str) -> str:
-    """Gera código determinístico a partir do CPF e do SALT."""
-    cpf_digits = _only_digits(cpf_digits)
-    salt = (current_app.config.get("MATRICULA_SALT") or "salt-fixo-para-matricula").encode()
-    digest = hmac.new(salt, cpf_digits.encode(), hashlib.sha1).hexdigest()
-    digits = int(current_app.config.get("MATRICULA_DIGITS", 5))
-    n = int(digest[:8], 16) % (10 ** digits)
-    prefix = current_app.config.get("MATRICULA_PREFIX", "MR")
-    return f"{prefix}{str(n).zfill(digits)}"
+    """
+    Gera código determinístico a partir do CPF e do SALT (blake2b com chave).
+    Espera o CPF já limpo (os callers validam com _is_valid_cpf_digits antes).
+    """
+    h = _KEYED_HASH.copy()
+    h.update(cpf_digits.encode())
+    # 4 primeiros bytes == int(hexdigest()[:8], 16), sem passar por hex
+    n = int.from_bytes(h.digest()[:4], "big") % _MODULUS
+    if _CODE_LUT is not None:
+        return _CODE_LUT[n]
+    return f"{_PREFIX}{str(n).zfill(_DIGITS)}"
+
+# Rotas que consultam o banco (export.csv fica de fora: varre a tabela inteira).
+# Páginas estáticas/memoizadas não estão aqui e não abrem conexão.
+_TIMEOUT_ENDPOINTS = frozenset({
+    "matricula.confirmacao",
+    "matricula.api_check",
+    "matricula.validate",
+    "matricula.api_lembrar",
+    "matricula.gerar_post",
+    "matricula.gerar_get",
+    "matricula.gerar_com_dados_post",
+    "matricula.gerar_com_dados_get",
+    "matricula.list_matriculas_json",
+})
+
+@matricula_bp.before_request
+def _cap_statement_timeout():
+    """
+    Limita a latência de cauda das consultas de matrícula (só Postgres).
+    Só marca a request: o SET LOCAL roda em _apply_statement_timeout quando a
+    sessão abre uma transação (acerto de cache = nenhum round-trip extra).
+    """
+    ms = current_app.config.get("MATRICULA_STATEMENT_TIMEOUT_MS", 0)
+    if ms and request.endpoint in _TIMEOUT_ENDPOINTS:
+        g._statement_timeout_ms = int(ms)
+
+def _apply_statement_timeout(session, transaction, connection):
+    # after_begin: 1x por transação (SET LOCAL vale até o COMMIT; reaplica na próxima)
+    if not has_request_context():
+        return
+    ms = g.get("_statement_timeout_ms")
+    if ms and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {ms}")
+
+@matricula_bp.record_once
+def _register_statement_timeout(state):
+    event.listen(db.session, "after_begin", _apply_statement_timeout)
 
 # ======================== Páginas HTML ========================
 @matricula_bp.get("/check")
 def check_page():
     """Página com formulário/JS (matricula_check.html)."""
-    return render_template("matricula_check.html")
+    return static_page("matricula_check.html")
 
 @matricula_bp.get("/consulta")
 def consulta():
@@ -70,13 +168,16 @@ def consulta():
     Versão interativa (AJAX no front): apenas entrega o HTML.
     O JS chama /matricula/validate e redireciona para /matricula/sucesso.
     """
-    return render_template("matricula_consulta.html")
+    return static_page("matricula_consulta.html")
 
 @matricula_bp.get("/sucesso")
 def sucesso_page():
     """Página estilizada de sucesso (usa ?code=MR12345)."""
-    code = (request.args.get("code") or "").strip().upper()
-    return render_template("matricula_success.html", code=code), 200
+    code, valid = normalize_code(request.args.get("code"))
+    if not valid:
+        # texto livre da querystring: renderiza sem guardar no cache
+        return render_page("matricula_success.html", code=code)
+    return keyed_page("matricula_success.html", code, code=code)
 
 @matricula_bp.get("/confirmacao")
 def confirmacao():
@@ -84,42 +185,44 @@ def confirmacao():
     Versão server-side (sem JS): valida via querystring (?code=MR12345)
     e reaproveita matricula_check.html mostrando painel verde/erros.
     """
-    code = (request.args.get("code") or "").strip().upper()
+    code, valid = normalize_code(request.args.get("code"))
     tried = bool(code)
 
     if not tried:
-        return render_template("matricula_check.html", tried=False)
+        # sem parâmetro a página não depende da request: renderizada 1x
+        # (mesmo HTML do /check)
+        return static_page("matricula_check.html")
 
-    if not FORMAT.fullmatch(code):
-        return render_template("matricula_check.html",
-                               tried=True, valida=False,
-                               msg="Formato inválido. Use MR + 5 dígitos (ex: MR25684).",
-                               code=code)
+    if not valid:
+        return render_page("matricula_check.html",
+                           tried=True, valida=False,
+                           msg="Formato inválido. Use MR + 5 dígitos (ex: MR25684).",
+                           code=code)
 
-    m = Matricula.query.filter_by(code=code).first()
+    m = lookup_matricula(code)
     if not m:
-        return render_template("matricula_check.html",
-                               tried=True, valida=False,
-                               msg="Matrícula não encontrada.",
-                               code=code)
+        return render_page("matricula_check.html",
+                           tried=True, valida=False,
+                           msg="Matrícula não encontrada.",
+                           code=code)
 
-    if getattr(m, "status", "active") != "active":
-        return render_template("matricula_check.html",
-                               tried=True, valida=False,
-                               msg=f"Matrícula inativa (status: {m.status}).",
-                               code=code)
+    if m.status != "active":
+        return render_page("matricula_check.html",
+                           tried=True, valida=False,
+                           msg=f"Matrícula inativa (status: {m.status}).",
+                           code=code)
 
     # ok, só exibe o painel verde
-    return render_template("matricula_check.html",
-                           tried=True, valida=True,
-                           code=m.code,
-                           nome=getattr(m, "holder_name", None))
+    return render_page("matricula_check.html",
+                       tried=True, valida=True,
+                       code=m.code,
+                       nome=m.holder_name)
 
 # ===== Página "Esqueci minha matrícula" =====
 @matricula_bp.get("/lembrar")
 def lembrar_page():
     """Página para recuperar matrícula por CPF + data de nascimento."""
-    return render_template("matricula_lembrar.html")
+    return static_page("matricula_lembrar.html")
 
 # ======================== APIs JSON ========================
 @matricula_bp.post("/api/check")
@@ -128,18 +231,20 @@ def api_check():
     Compatível com o JS do matricula_check.html (fetch url_for('matricula.api_check')).
     Corpo: { "matricula": "MR12345" }
     """
-    data = request.get_json(silent=True) or {}
-    code = (data.get("matricula") or "").upper().strip()
+    data, err = small_json_body()
+    if err:
+        return err
+    code, valid = normalize_code(data.get("matricula"))
 
     if not code:
         return jsonify(ok=False, message="Informe a matrícula."), 400
-    if not FORMAT.fullmatch(code):
+    if not valid:
         return jsonify(ok=False, code=code, message="Formato inválido. Use MR + 5 dígitos."), 200
 
-    m = Matricula.query.filter_by(code=code).first()
+    m = lookup_matricula(code)
     if not m:
         return jsonify(ok=False, code=code, message="Matrícula não encontrada."), 200
-    if getattr(m, "status", "active") != "active":
+    if m.status != "active":
         return jsonify(ok=False, code=code, message=f"Matrícula inativa (status: {m.status})."), 200
 
     return jsonify(ok=True, code=code, message=f"Matrícula {code} validada."), 200
@@ -147,17 +252,17 @@ def api_check():
 @matricula_bp.get("/validate")
 def validate():
     """Validação via GET (?code=MR12345) para integrações/consulta AJAX."""
-    code = (request.args.get("code") or "").strip().upper()
-    if not FORMAT.fullmatch(code):
+    code, valid = normalize_code(request.args.get("code"))
+    if not valid:
         return jsonify({"valid": False, "message": "Formato inválido (MR + 5 dígitos)"}), 400
-    m = Matricula.query.filter_by(code=code).first()
+    m = lookup_matricula(code)
     if not m:
         return jsonify({"valid": False, "message": "Matrícula não encontrada"}), 404
     return jsonify({
-        "valid": getattr(m, "status", "active") == "active",
+        "valid": m.status == "active",
         "code": m.code,
-        "status": getattr(m, "status", None),
-        "cpf": getattr(m, "cpf", None)
+        "status": m.status,
+        "cpf": m.cpf
     }), 200
 
 # ===== API "Esqueci minha matrícula" =====
@@ -167,7 +272,9 @@ def api_lembrar():
     Recebe JSON: { "cpf": "...", "birth_date": "DD/MM/AAAA" } (também aceita chave "birth").
     Retorna a matrícula se encontrar correspondência exata.
     """
-    data = request.get_json(silent=True) or {}
+    data, err = small_json_body()
+    if err:
+        return err
     cpf_raw = data.get("cpf")
     birth_raw = data.get("birth_date") or data.get("birth")  # aceita as duas chaves
 
@@ -179,18 +286,58 @@ def api_lembrar():
     if not birth:
         return jsonify(ok=False, message="Data de nascimento inválida. Use DD/MM/AAAA."), 400
 
-    m = Matricula.query.filter_by(cpf=cpf, birth_date=birth).first()
+    # Só as colunas da resposta; birth_date é String(10) ISO no banco
+    m = db.session.execute(
+        select(Matricula.code, Matricula.holder_name, Matricula.status)
+        .where(Matricula.cpf == cpf, Matricula.birth_date == birth.isoformat())
+        .limit(1)
+    ).first()
 
     if not m:
         # Resposta neutra (não revela se o CPF existe)
         return jsonify(ok=False, message="Não encontramos matrícula para os dados informados."), 200
 
-    if getattr(m, "status", "active") != "active":
+    if m.status != "active":
         return jsonify(ok=False, message=f"Matrícula localizada, porém está '{m.status}'."), 200
 
     return jsonify(ok=True, code=m.code, holder_name=m.holder_name), 200
 
 # ======================== Gerar matrícula (CPF e opcionais birth/name) ========================
+def _upsert_stmt(cpf: str, code: str, birth_iso, holder_name):
+    """INSERT ... ON CONFLICT (cpf) DO UPDATE ... RETURNING (Postgres/SQLite)."""
+    insert = pg_insert if db.session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(Matricula).values(
+        code=code, cpf=cpf, birth_date=birth_iso, holder_name=holder_name, status="active"
+    )
+    # só preenche birth_date/holder_name se ainda estiverem vazios
+    return stmt.on_conflict_do_update(
+        index_elements=[Matricula.cpf],
+        set_={
+            "birth_date": func.coalesce(func.nullif(Matricula.birth_date, ""), stmt.excluded.birth_date),
+            "holder_name": func.coalesce(func.nullif(Matricula.holder_name, ""), stmt.excluded.holder_name),
+        },
+    ).returning(
+        Matricula.code, Matricula.cpf, Matricula.birth_date, Matricula.holder_name, Matricula.status
+    )
+
+def _upsert_matricula(cpf: str, birth_date=None, holder_name=None):
+    """
+    Cria (ou completa) a matrícula do CPF em um único round-trip.
+    Se o código derivado já pertencer a outro CPF, tenta a variante "|1".
+    Retorna a Row (code, cpf, birth_date, holder_name, status).
+    """
+    birth_iso = birth_date.isoformat() if birth_date else None
+    try:
+        row = db.session.execute(_upsert_stmt(cpf, _code_from_cpf(cpf), birth_iso, holder_name)).one()
+    except IntegrityError:
+        # colisão no índice único de code (outro CPF)
+        db.session.rollback()
+        row = db.session.execute(_upsert_stmt(cpf, _code_from_cpf(cpf + "|1"), birth_iso, holder_name)).one()
+    db.session.commit()
+    _invalidate_list()
+    forget_matricula(row.code)
+    return row
+
 @matricula_bp.post("/gerar")
 def gerar_post():
     """
@@ -199,7 +346,9 @@ def gerar_post():
       { "cpf": "12345678909", "birth_date": "DD/MM/AAAA", "holder_name": "opcional" }
       (também aceita chave "birth")
     """
-    data = request.get_json(silent=True) or {}
+    data, err = small_json_body()
+    if err:
+        return err
     cpf_raw = data.get("cpf")
     cpf = _only_digits(cpf_raw)
     birth_raw = data.get("birth_date") or data.get("birth")
@@ -212,38 +361,8 @@ def gerar_post():
     if birth_raw and not birth_date:
         return jsonify({"ok": False, "message": "Data de nascimento inválida. Use DD/MM/AAAA."}), 400
 
-    existing = Matricula.query.filter_by(cpf=cpf).first()
-    if existing:
-        # atualiza birth_date/holder_name se vierem agora e ainda não existirem
-        changed = False
-        if birth_date and not getattr(existing, "birth_date", None):
-            existing.birth_date = birth_date; changed = True
-        if holder_name and not getattr(existing, "holder_name", None):
-            existing.holder_name = holder_name; changed = True
-        if changed:
-            db.session.commit()
-        return jsonify({"ok": True, "matricula": {
-            "code": existing.code,
-            "cpf": existing.cpf,
-            "birth_date": existing.birth_date.isoformat() if getattr(existing, "birth_date", None) else None,
-            "holder_name": existing.holder_name,
-            "status": existing.status
-        }}), 200
-
-    code = _code_from_cpf(cpf)
-    # Evita colisão eventual
-    if Matricula.query.filter_by(code=code).first():
-        code = _code_from_cpf(cpf + "|1")
-
-    m = Matricula(code=code, cpf=cpf, birth_date=birth_date, holder_name=holder_name, status="active")
-    db.session.add(m)
-    db.session.commit()
-    return jsonify({"ok": True, "matricula": {
-        "code": m.code, "cpf": m.cpf,
-        "birth_date": m.birth_date.isoformat() if m.birth_date else None,
-        "holder_name": m.holder_name,
-        "status": m.status
-    }}), 200
+    m = _upsert_matricula(cpf, birth_date, holder_name)
+    return jsonify({"ok": True, "matricula": _json_matricula(m)}), 200
 
 @matricula_bp.get("/gerar")
 def gerar_get():
@@ -264,45 +383,23 @@ def gerar_get():
     if birth_raw and not birth_date:
         return jsonify({"ok": False, "message": "Data de nascimento inválida. Use DD/MM/AAAA."}), 400
 
-    existing = Matricula.query.filter_by(cpf=cpf).first()
-    if existing:
-        changed = False
-        if birth_date and not getattr(existing, "birth_date", None):
-            existing.birth_date = birth_date; changed = True
-        if holder_name and not getattr(existing, "holder_name", None):
-            existing.holder_name = holder_name; changed = True
-        if changed:
-            db.session.commit()
-        return jsonify({"ok": True, "matricula": {
-            "code": existing.code,
-            "cpf": existing.cpf,
-            "birth_date": existing.birth_date.isoformat() if getattr(existing, "birth_date", None) else None,
-            "holder_name": existing.holder_name,
-            "status": existing.status
-        }}), 200
-
-    code = _code_from_cpf(cpf)
-    if Matricula.query.filter_by(code=code).first():
-        code = _code_from_cpf(cpf + "|1")
-
-    m = Matricula(code=code, cpf=cpf, birth_date=birth_date, holder_name=holder_name, status="active")
-    db.session.add(m)
-    db.session.commit()
-    return jsonify({"ok": True, "matricula": {
-        "code": m.code, "cpf": m.cpf,
-        "birth_date": m.birth_date.isoformat() if m.birth_date else None,
-        "holder_name": m.holder_name,
-        "status": m.status
-    }}), 200
+    m = _upsert_matricula(cpf, birth_date, holder_name)
+    return jsonify({"ok": True, "matricula": _json_matricula(m)}), 200
 
 # ======================== Versão CPF + data (rotas dedicadas) ========================
+def _exists(*criteria) -> bool:
+    """SELECT EXISTS(...): só um booleano, sem hidratar Matricula."""
+    return db.session.scalar(select(exists().where(*criteria)))
+
 @matricula_bp.post("/gerar_dados")
 def gerar_com_dados_post():
     """
     Gera (ou retorna) a matrícula usando CPF + Data de Nascimento (DD/MM/AAAA).
     Body JSON: { "cpf": "10688046967", "birth": "04/07/2001" }  // ou "birth_date"
     """
-    data = request.get_json(silent=True) or {}
+    data, err = small_json_body()
+    if err:
+        return err
     cpf = _only_digits(data.get("cpf"))
     birth_raw = data.get("birth") or data.get("birth_date")
     birth = _parse_birth_date(birth_raw)
@@ -312,56 +409,45 @@ def gerar_com_dados_post():
     if not birth:
         return jsonify(ok=False, message="Data de nascimento inválida. Use DD/MM/AAAA."), 400
 
-    rows = Matricula.query.filter_by(cpf=cpf).all()
-
-    if rows:
-        # 1) Já existe alguma matrícula com a MESMA data? -> retorna ela
-        for r in rows:
-            if getattr(r, "birth_date", None) == birth:
-                return jsonify({"ok": True, "matricula": {
-                    "code": r.code,
-                    "cpf": r.cpf,
-                    "birth_date": _birth_iso(getattr(r, "birth_date", None)),
-                    "holder_name": getattr(r, "holder_name", None),
-                    "status": r.status
-                }}), 200
-
-        # 2) Existe alguma sem data? -> preenche e retorna
-        for r in rows:
-            if getattr(r, "birth_date", None) in (None, ""):
-                r.birth_date = birth
-                db.session.commit()
-                return jsonify({"ok": True, "matricula": {
-                    "code": r.code,
-                    "cpf": r.cpf,
-                    "birth_date": _birth_iso(getattr(r, "birth_date", None)),
-                    "holder_name": getattr(r, "holder_name", None),
-                    "status": r.status
-                }}), 200
-
-        # 3) Todas têm data diferente -> conflito
+    # birth_date é String(10) "YYYY-MM-DD" no banco: filtra pela forma ISO
+    birth_key = birth.isoformat()
+
+    # 1) Já existe alguma matrícula com a MESMA data? -> retorna ela
+    r = db.session.execute(
+        select(Matricula.code, Matricula.cpf, Matricula.birth_date,
+               Matricula.holder_name, Matricula.status)
+        .where(Matricula.cpf == cpf, Matricula.birth_date == birth_key)
+        .limit(1)
+    ).first()
+    if r:
+        return jsonify({"ok": True, "matricula": _json_matricula(r)}), 200
+
+    # 2) Existe alguma sem data? -> preenche e retorna
+    r = (Matricula.query.filter_by(cpf=cpf)
+         .filter(or_(Matricula.birth_date.is_(None), Matricula.birth_date == ""))
+         .first())
+    if r:
+        r.birth_date = _birth_iso(birth)
+        db.session.commit()
+        _invalidate_list()
+        return jsonify({"ok": True, "matricula": _json_matricula(r)}), 200
+
+    # 3) CPF existe, mas todas têm data diferente -> conflito
+    if _exists(Matricula.cpf == cpf):
         return jsonify(ok=False, message="Data de nascimento não confere para este CPF."), 409
 
     # 4) Nenhuma matrícula com esse CPF -> cria
     code = _code_from_cpf(cpf)
-    if Matricula.query.filter_by(code=code).first():
+    if _exists(Matricula.code == code):
         code = _code_from_cpf(cpf + "|1")
 
     m = Matricula(code=code, cpf=cpf, status="active")
-    m.birth_date = birth
+    m.birth_date = _birth_iso(birth)
     db.session.add(m)
     db.session.commit()
+    _invalidate_list()
 
-    return jsonify({
-        "ok": True,
-        "matricula": {
-            "code": m.code,
-            "cpf": m.cpf,
-            "birth_date": _birth_iso(getattr(m, "birth_date", None)),
-            "holder_name": getattr(m, "holder_name", None),
-            "status": m.status
-        }
-    }), 200
+    return jsonify({"ok": True, "matricula": _json_matricula(m)}), 200
 
 
 @matricula_bp.get("/gerar_dados")
@@ -381,100 +467,99 @@ def gerar_com_dados_get():
 
     existing = Matricula.query.filter_by(cpf=cpf).first()
     if existing:
-        if getattr(existing, "birth_date", None) and existing.birth_date != birth:
+        if existing.birth_date and _birth_iso(existing.birth_date) != birth.isoformat():
             return jsonify(ok=False, message="Data de nascimento não confere para este CPF."), 409
-        if not getattr(existing, "birth_date", None):
-            existing.birth_date = birth
+        if not existing.birth_date:
+            existing.birth_date = _birth_iso(birth)
             db.session.commit()
-        return jsonify({
-            "ok": True,
-            "matricula": {
-                "code": existing.code,
-                "cpf": existing.cpf,
-                "birth_date": getattr(existing, "birth_date", None).isoformat() if getattr(existing, "birth_date", None) else None,
-                "status": existing.status
-            }
-        }), 200
-
-        # Converte um valor de birth_date (date | str | None) para ISO 'YYYY-MM-DD'
-DATE_ISO_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
-
-def _birth_iso(value):
-    if not value:
-        return None
-    if isinstance(value, _dt.date):
-        return value.isoformat()
-    s = str(value).strip()
-    if DATE_ISO_RE.fullmatch(s):
-        return s
-    if DATE_RE.fullmatch(s):  # 'DD/MM/AAAA' -> ISO
-        d, m, y = [int(x) for x in s.split("/")]
-        try:
-            return _dt.date(y, m, d).isoformat()
-        except Exception:
-            return None
-    # formato desconhecido
-    return None
-
-def _json_matricula(m):
-    return {
-        "code": m.code,
-        "cpf": m.cpf,
-        "birth_date": _birth_iso(getattr(m, "birth_date", None)),
-        "holder_name": getattr(m, "holder_name", None),
-        "status": getattr(m, "status", None),
-    }
-
+            _invalidate_list()
+        return jsonify({"ok": True, "matricula": _json_matricula(existing)}), 200
 
     code = _code_from_cpf(cpf)
-    if Matricula.query.filter_by(code=code).first():
+    if _exists(Matricula.code == code):
         code = _code_from_cpf(cpf + "|1")
 
     m = Matricula(code=code, cpf=cpf, status="active")
-    m.birth_date = birth
+    m.birth_date = _birth_iso(birth)
     db.session.add(m)
     db.session.commit()
+    _invalidate_list()
 
-    return jsonify({
-        "ok": True,
-        "matricula": {
-            "code": m.code,
-            "cpf": m.cpf,
-            "birth_date": m.birth_date.isoformat() if getattr(m, "birth_date", None) else None,
-            "status": m.status
-        }
-    }), 200
+    return jsonify({"ok": True, "matricula": _json_matricula(m)}), 200
 
 # ======================== Listar / Exportar ========================
+def _list_payload() -> dict:
+    """Últimas 200 matrículas (memoizado por alguns segundos; ver _invalidate_list)."""
+    # Só colunas (Row), sem hidratar objetos Matricula no identity map
+    stmt = (
+        select(Matricula.code, Matricula.cpf, Matricula.birth_date,
+               Matricula.holder_name, Matricula.status)
+        .order_by(Matricula.created_at.desc())
+        .limit(200)
+    )
+    items = [{
+        "code": r.code,
+        "cpf": r.cpf,
+        "birth_date": _birth_iso(r.birth_date),
+        "holder_name": r.holder_name,
+        "status": r.status,
+    } for r in db.session.execute(stmt)]
+    return {"count": len(items), "items": items}
+
+def _list_body():
+    """(JSON já serializado, ETag do conteúdo) do /list.json."""
+    body = current_app.json.dumps(_list_payload()).encode()
+    return body, hashlib.blake2b(body, digest_size=8).hexdigest()
+
+if cache:
+    _list_body = cache.memoize(timeout=5)(_list_body)
+
+def _invalidate_list():
+    """Descarta o /list.json memoizado após criar/alterar matrícula."""
+    if cache:
+        cache.delete_memoized(_list_body)
+
 @matricula_bp.get("/list.json")
 def list_matriculas_json():
-    # Ordena por created_at se existir; senão, por id desc
-    order_col = getattr(Matricula, "created_at", None) or Matricula.id
-    q = Matricula.query.order_by(order_col.desc()).limit(200)
-    items = [{
-    "code": m.code,
-    "cpf": m.cpf,
-    "birth_date": _birth_iso(getattr(m, "birth_date", None)),
-    "holder_name": m.holder_name,
-    "status": m.status
-} for m in q.all()]
-    return jsonify({"count": len(items), "items": items})
+    # ETag = hash do corpo: também muda quando uma matrícula é completada/alterada
+    body, etag = _list_body()
+    resp = Response(body, mimetype="application/json")
+    resp.set_etag(etag, weak=True)
+    resp.headers["Cache-Control"] = "private, max-age=5"
+    return resp.make_conditional(request)
 
 @matricula_bp.get("/export.csv")
 def export_matriculas_csv():
-    order_col = getattr(Matricula, "created_at", None) or Matricula.id
-    q = Matricula.query.order_by(order_col.desc())
-    output = io.StringIO(newline="")
-    writer = csv.writer(output)
-    writer.writerow(["code", "cpf", "birth_date", "holder_name", "status"])
-    for m in q.all():
-        writer.writerow([
-            m.code,
-            m.cpf or "",
-            (m.birth_date.isoformat() if getattr(m, "birth_date", None) else ""),
-            m.holder_name or "",
-            m.status
-        ])
-    resp = Response(output.getvalue(), mimetype="text/csv; charset=utf-8")
-    resp.headers["Content-Disposition"] = "attachment; filename=matriculas.csv"
-    return resp
\ No newline at end of file
+    if copy_supported():
+        # Postgres: CSV montado pelo próprio banco (COPY ... TO STDOUT);
+        # birth_date passa pela mesma regra de _birth_iso, em SQL
+        bd = func.trim(Matricula.birth_date)
+        birth_iso = case(
+            (and_(func.length(bd) == 10,
+                  func.substr(bd, 5, 1) == "-",
+                  func.substr(bd, 8, 1) == "-"), bd),
+        )
+        stmt = (
+            select(Matricula.code, Matricula.cpf, birth_iso.label("birth_date"),
+                   Matricula.holder_name, Matricula.status)
+            .order_by(Matricula.created_at.desc())
+        )
+        return copy_csv_response(stmt, "matriculas.csv")
+
+    # Cursor do lado do servidor + lotes de 1000: memória O(1)
+    stmt = (
+        select(Matricula.code, Matricula.cpf, Matricula.birth_date,
+               Matricula.holder_name, Matricula.status)
+        .order_by(Matricula.created_at.desc())
+        .execution_options(stream_results=True, yield_per=1000)
+    )
+    rows = ((
+        r.code,
+        r.cpf or "",
+        _birth_iso(r.birth_date) or "",
+        r.holder_name or "",
+        r.status,
+    ) for r in db.session.execute(stmt))
+    return csv_response(
+        ["code", "cpf", "birth_date", "holder_name", "status"], rows, "matriculas.csv"
+    )
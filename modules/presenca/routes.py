@@ -1,39 +1,75 @@
 # modules/presenca/routes.py
-import csv
-import io
-import re
+import base64
 import datetime as dt
+import hashlib
 from typing import Optional
 
-from flask import Blueprint, request, jsonify, Response, render_template
-from sqlalchemy.exc import IntegrityError
+from flask import Blueprint, request, jsonify, Response, g, current_app
+from sqlalchemy import func, literal, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
+from app import limiter
 from models import db, Matricula, Presenca
+from modules.utils.export import copy_csv_response, copy_supported, csv_response, json_bytes
+from modules.utils.http import small_json_body
+from modules.utils.matriculas import lookup_matricula, normalize_code
+from modules.utils.pages import keyed_page, render_page, static_page
+from modules.presenca.tasks import (
+    PresencaBatchWriter, Retry, clear_queued_key, queued_key, record_presenca
+)
 
 # -------------------------------------------------------------------
 # Blueprint com prefixo /presenca
 # -------------------------------------------------------------------
 presenca_bp = Blueprint("presenca", __name__, url_prefix="/presenca")
 
-# padrão MR + 5 dígitos (ex.: MR25684)
-FORMAT = re.compile(r"^MR\d{5}$")
+# APIs públicas chaveadas por um código curto (fáceis de varrer por script):
+# limite por IP nas rotas que consultam/gravam no banco (o formulário é estático)
+API_RATE_LIMIT = "60/minute"
+
+# Marca "presença de hoje já enfileirada" no Redis (só com a fila ligada)
+QUEUED_KEY_TTL = 2 * 24 * 3600
+
+# Exports acima disto (sem filtro de código) saem via COPY no Postgres
+COPY_EXPORT_MIN_DAYS = 30
+
+@presenca_bp.record_once
+def _init_batch_writer(state):
+    # PRESENCA_BATCH_WRITES=1: grava em lote no processo (a fila RQ tem prioridade)
+    app = state.app
+    if app.config.get("PRESENCA_BATCH_WRITES") and "presenca_queue" not in app.extensions:
+        app.extensions["presenca_writer"] = PresencaBatchWriter(app)
 
 # ===================== Helpers =====================
 
-def _today_utc() -> dt.date:
-    """Retorna a data (UTC) para controle de presença diária."""
-    return dt.datetime.utcnow().date()
+def _rate_limit(rule: str):
+    """limiter.limit(rule) com Flask-Limiter instalado; sem ele, não faz nada."""
+    return limiter.limit(rule) if limiter else (lambda f: f)
 
 def _utcnow() -> dt.datetime:
-    return dt.datetime.utcnow()
+    """Instante (UTC, aware) da requisição — lido 1x e reaproveitado via g."""
+    if "_now" not in g:
+        g._now = dt.datetime.now(dt.UTC)
+    return g._now
+
+def _today_utc() -> dt.date:
+    """Retorna a data (UTC) para controle de presença diária."""
+    return _utcnow().date()
 
 def _client_ip() -> Optional[str]:
-    """Extrai o IP real do cliente (considera X-Forwarded-For)."""
-    xff = request.headers.get("X-Forwarded-For", "")
-    if xff:
+    """Extrai o IP real do cliente (considera X-Forwarded-For); memoizado em g."""
+    if "_ip" not in g:
+        xff = request.headers.get("X-Forwarded-For", "")
         # XFF pode vir como 'ip1, ip2, ip3' — o primeiro é o cliente
-        return xff.split(",")[0].strip()
-    return request.remote_addr
+        g._ip = xff.split(",", 1)[0].strip() if xff else request.remote_addr
+    return g._ip
+
+def _user_agent() -> str:
+    """User-Agent cru (até 300 chars), sem o parser do werkzeug; memoizado em g."""
+    if "_ua" not in g:
+        g._ua = (request.headers.get("User-Agent") or "")[:300]
+    return g._ua
 
 def _json_error(message: str, status_code: int = 200):
     """Convenção de erro padrão."""
@@ -45,109 +81,256 @@ def _parse_date(s: Optional[str]) -> Optional[dt.date]:
     except Exception:
         return None
 
+def _matriculas_by_id(ids) -> dict:
+    """id -> Row(id, code, holder_name, status), numa só consulta IN (...)."""
+    if not ids:
+        return {}
+    rows = db.session.execute(
+        select(Matricula.id, Matricula.code, Matricula.holder_name, Matricula.status)
+        .where(Matricula.id.in_(ids))
+    )
+    return {r.id: r for r in rows}
+
+def _insert_presenca(code: str, source: str) -> Optional[int]:
+    """
+    Resolve a matrícula e registra a presença do dia num único statement:
+      INSERT INTO presencas (...) SELECT m.id, ... FROM matriculas m
+       WHERE m.code = :code AND m.status = 'active'
+      ON CONFLICT (matricula_id, date_key) DO NOTHING RETURNING id
+    Retorna o id criado, ou None se não inseriu (matrícula inexistente/inativa ou
+    presença do dia já registrada — quem chama distingue via lookup_matricula).
+    """
+    insert = pg_insert if db.session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    src = select(
+        Matricula.id,
+        literal(_today_utc(), Presenca.date_key.type),
+        literal(_utcnow(), Presenca.timestamp.type),
+        literal(_client_ip(), Presenca.ip.type),
+        literal(_user_agent(), Presenca.user_agent.type),
+        literal(source, Presenca.source.type),
+    ).where(Matricula.code == code, Matricula.status == "active")
+    stmt = (
+        insert(Presenca)
+        .from_select(
+            ["matricula_id", "date_key", "timestamp", "ip", "user_agent", "source"], src
+        )
+        .on_conflict_do_nothing(index_elements=[Presenca.matricula_id, Presenca.date_key])
+        .returning(Presenca.id)
+    )
+    pid = db.session.execute(stmt).scalar()
+    db.session.commit()
+    return pid
+
+def _deferred_writes() -> bool:
+    """Presença gravada fora da request (fila RQ ou escrita em lote)?"""
+    ext = current_app.extensions
+    return "presenca_queue" in ext or "presenca_writer" in ext
+
+def _enqueue_presenca(m, source: str) -> Optional[bool]:
+    """
+    Com a fila RQ configurada: SET NX presenca:seen:{id}:{dia} como trava de
+    idempotência e enfileira o INSERT (record_presenca) para o worker.
+    Com a escrita em lote: confere no banco se já há presença hoje e entrega
+    a linha ao PresencaBatchWriter.
+    Retorna True se enfileirou, False se já havia presença hoje, ou None
+    sem nenhum dos dois (quem chama grava direto via _insert_presenca).
+    `m` precisa ser uma matrícula ativa (validada antes).
+    """
+    queue = current_app.extensions.get("presenca_queue")
+    writer = current_app.extensions.get("presenca_writer")
+    if queue is None and writer is None:
+        return None
+    today = _today_utc()
+
+    if queue is not None:
+        key = queued_key(m.id, today)
+        if not queue.connection.set(key, 1, nx=True, ex=QUEUED_KEY_TTL):
+            return False
+        try:
+            queue.enqueue(
+                record_presenca, m.id, today, _utcnow(), _client_ip(), _user_agent(), source,
+                retry=Retry(max=3, interval=[1, 5, 15]),
+                on_failure=clear_queued_key,
+            )
+        except Exception:
+            # não enfileirou: solta a trava (senão o retry do aluno vira "já registrada")
+            queue.connection.delete(key)
+            raise
+        return True
+
+    # conjunto do dia em memória primeiro; o SELECT só roda 1x por matrícula/dia
+    if writer.seen(m.id, today):
+        return False
+    already = db.session.execute(
+        select(Presenca.id)
+        .where(Presenca.matricula_id == m.id, Presenca.date_key == today)
+        .limit(1)
+    ).first()
+    if already:
+        writer.remember(m.id, today)
+        return False
+    return writer.submit({
+        "matricula_id": m.id,
+        "date_key": today,
+        "timestamp": _utcnow(),
+        "ip": _client_ip(),
+        "user_agent": _user_agent(),
+        "source": source,
+    })
+
+def _filter_date_range(q, start, end):
+    """
+    Intervalo semiaberto [start, end + 1 dia): a coluna nunca é envolvida em
+    função/cast, então o filtro segue usando índice mesmo se date_key virar timestamp.
+    """
+    if start:
+        q = q.filter(Presenca.date_key >= start)
+    if end:
+        q = q.filter(Presenca.date_key < end + dt.timedelta(days=1))
+    return q
+
+def _iso_text_columns():
+    """
+    (date_key, timestamp) como texto ISO gerado no SQL: to_char no Postgres
+    (timestamp convertido p/ UTC), strftime no SQLite.
+    """
+    if db.session.get_bind().dialect.name == "postgresql":
+        return (
+            func.to_char(Presenca.date_key, "YYYY-MM-DD"),
+            func.to_char(func.timezone("UTC", Presenca.timestamp), 'YYYY-MM-DD"T"HH24:MI:SS.US"+00:00"'),
+        )
+    return (
+        func.strftime("%Y-%m-%d", Presenca.date_key),
+        func.strftime("%Y-%m-%dT%H:%M:%f", Presenca.timestamp),
+    )
+
+def _presenca_items(rows) -> list:
+    mats = _matriculas_by_id({r.matricula_id for r in rows})
+    return [{
+        "id": r.id,
+        "date_key": r.date_key,
+        "timestamp_utc": r.timestamp,
+        "code": mats[r.matricula_id].code,
+        "holder_name": mats[r.matricula_id].holder_name,
+        "status": mats[r.matricula_id].status,
+        "ip": r.ip,
+        "source": r.source,
+    } for r in rows]
+
+def _encode_cursor(r) -> str:
+    """Cursor opaco (base64 urlsafe) de 'date_key|timestamp|id'."""
+    raw = f"{r.date_key.isoformat()}|{r.timestamp.isoformat()}|{r.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str):
+    """Inverso de _encode_cursor -> (date_key, timestamp, id) ou None se inválido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        dk, ts, pid = raw.split("|")
+        return dt.date.fromisoformat(dk), dt.datetime.fromisoformat(ts), int(pid)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
 # ===================== PÁGINAS (HTML) =====================
 
 @presenca_bp.get("/")
 def presenca_page():
     """Entrega o formulário. A interação é via fetch (JS no template)."""
-    return render_template("presenca_form.html")
+    return static_page("presenca_form.html")
 
 @presenca_bp.get("/sucesso")
 def sucesso():
     """Renderiza a página de sucesso. Uso: /presenca/sucesso?code=MR25684"""
-    code = (request.args.get("code") or "").strip().upper()
-    return render_template("presenca_success.html", code=code)
+    code, valid = normalize_code(request.args.get("code"))
+    if not valid:
+        # texto livre da querystring: renderiza sem guardar no cache
+        return render_page("presenca_success.html", code=code)
+    return keyed_page("presenca_success.html", code, code=code)
 
 # ===================== APIs JSON (usadas pelo fetch) =====================
 
 @presenca_bp.post("/api/check")
+@_rate_limit(API_RATE_LIMIT)
 def api_check():
     """Verifica se a matrícula existe e está ativa. Corpo: { "matricula": "MR25684" }"""
-    data = request.get_json(silent=True) or {}
-    code = (data.get("matricula") or "").strip().upper()
+    data, err = small_json_body()
+    if err:
+        return err
+    code, valid = normalize_code(data.get("matricula"))
 
     if not code:
         return _json_error("Informe a matrícula.", 400)
-    if not FORMAT.fullmatch(code):
+    if not valid:
         return _json_error("Formato inválido (MR + 5 dígitos).")
 
-    m = Matricula.query.filter_by(code=code).first()
+    m = lookup_matricula(code)
     if not m:
         return _json_error("Matrícula não encontrada.")
-    if getattr(m, "status", "active") != "active":
+    if m.status != "active":
         return _json_error(f"Matrícula inativa (status: {m.status}).")
 
     return jsonify(ok=True, code=code), 200
 
 @presenca_bp.post("/api/registrar")
+@_rate_limit(API_RATE_LIMIT)
 def api_registrar():
     """
     Registra presença 1x por dia (controle por (matricula_id, date_key)).
     Corpo: { "matricula": "MR25684" }
     """
-    data = request.get_json(silent=True) or {}
-    code = (data.get("matricula") or "").strip().upper()
+    data, err = small_json_body()
+    if err:
+        return err
+    code, valid = normalize_code(data.get("matricula"))
 
-    if not FORMAT.fullmatch(code):
+    if not valid:
         return _json_error("Formato inválido (MR + 5 dígitos).")
 
-    m = Matricula.query.filter_by(code=code).first()
-    if not m or getattr(m, "status", "active") != "active":
-        return _json_error("Matrícula inválida ou inativa.")
+    if _deferred_writes():
+        # fila/lote ligado: valida pelo cache e deixa o INSERT para fora da request
+        m = lookup_matricula(code)
+        if not m or m.status != "active":
+            return _json_error("Matrícula inválida ou inativa.")
+        if _enqueue_presenca(m, "web"):
+            return jsonify(ok=True, already=False, code=code), 200
+        return jsonify(ok=True, already=True, code=code, message="Presença já registrada hoje."), 200
 
-    today = _today_utc()
-    p = Presenca(
-        matricula_id=m.id,
-        date_key=today,
-        timestamp=_utcnow(),
-        ip=_client_ip(),
-        user_agent=(request.user_agent.string or "")[:300],
-        source="web",
-    )
+    # caminho feliz: 1 round-trip (lookup + insert no mesmo statement)
+    pid = _insert_presenca(code, "web")
+    if pid is not None:
+        return jsonify(ok=True, already=False, id=pid, code=code), 200
 
-    db.session.add(p)
-    try:
-        db.session.commit()
-        return jsonify(ok=True, already=False, id=p.id, code=code), 200
-    except IntegrityError:
-        # Já existe presença para (matricula_id, date_key)
-        db.session.rollback()
-        return jsonify(ok=True, already=True, code=code, message="Presença já registrada hoje."), 200
+    m = lookup_matricula(code)
+    if not m or m.status != "active":
+        return _json_error("Matrícula inválida ou inativa.")
+    # Já existe presença para (matricula_id, date_key)
+    return jsonify(ok=True, already=True, code=code, message="Presença já registrada hoje."), 200
 
 # ===================== API GET (REGISTRAR idempotente) =====================
 
 @presenca_bp.get("/api/register")
+@_rate_limit(API_RATE_LIMIT)
 def presenca_api_register_get():
     """
     Variante GET idempotente para registrar (antes era GET /presenca/api).
     Uso: /presenca/api/register?matricula=MR25684
     """
-    code = (request.args.get("matricula") or "").strip().upper()
-    if not FORMAT.fullmatch(code):
+    code, valid = normalize_code(request.args.get("matricula"))
+    if not valid:
         return jsonify({"ok": False, "msg": "Formato inválido"}), 400
 
-    m = Matricula.query.filter_by(code=code).first()
+    queued = _deferred_writes()
+    if not queued and _insert_presenca(code, "api") is not None:
+        return jsonify({"ok": True, "already": False, "code": code}), 200
+
+    m = lookup_matricula(code)
     if not m:
         return jsonify({"ok": False, "msg": "Matrícula não encontrada"}), 404
-    if getattr(m, "status", "active") != "active":
+    if m.status != "active":
         return jsonify({"ok": False, "msg": f"Matrícula inativa (status: {m.status})."}), 200
-
-    today = _today_utc()
-    p = Presenca(
-        matricula_id=m.id,
-        date_key=today,
-        timestamp=_utcnow(),
-        ip=_client_ip(),
-        user_agent=(request.user_agent.string or "")[:300],
-        source="api",
-    )
-    db.session.add(p)
-    try:
-        db.session.commit()
+    if queued and _enqueue_presenca(m, "api"):
         return jsonify({"ok": True, "already": False, "code": m.code}), 200
-    except IntegrityError:
-        db.session.rollback()
-        return jsonify({"ok": True, "already": True, "code": m.code}), 200
+    return jsonify({"ok": True, "already": True, "code": m.code}), 200
 
 # ===================== API GET (LISTAR) =====================
 
@@ -159,13 +342,16 @@ def presenca_api_get():
       - matricula=MR41081 (opcional; recomendado sem auth)
       - start=YYYY-MM-DD (opcional)
       - end=YYYY-MM-DD (opcional)
-      - page=1 (opcional)
+      - cursor=... (opcional; valor de next_cursor da resposta anterior)
       - per_page=50 (opcional; máx 100)
+      - page=1 (DEPRECADO: paginação por OFFSET + COUNT(*); use cursor)
+    Resposta (keyset): { ok, per_page, has_more, next_cursor, items }
     Obs.: modelo usa Presenca.matricula_id, date_key (date) e timestamp (datetime).
     """
-    code  = (request.args.get("matricula") or "").strip().upper()
+    code, valid = normalize_code(request.args.get("matricula"))
     start = _parse_date(request.args.get("start"))
     end   = _parse_date(request.args.get("end"))
+    legacy = "page" in request.args and "cursor" not in request.args
 
     # paginação segura
     try:
@@ -177,53 +363,66 @@ def presenca_api_get():
     except ValueError:
         per_page = 50
 
-    # base: join para trazer o code, pois a tabela tem matricula_id
+    after = None
+    if request.args.get("cursor"):
+        after = _decode_cursor(request.args["cursor"])
+        if after is None:
+            return jsonify(ok=False, error="invalid_cursor"), 400
+
+    # Página só com colunas de presencas (índice (matricula_id, date_key, timestamp));
+    # os dados da matrícula vêm depois num único IN (...) com os ids da página.
     q = db.session.query(
         Presenca.id,
+        Presenca.matricula_id,
         Presenca.date_key,
         Presenca.timestamp,
         Presenca.ip,
         Presenca.source,
-        Matricula.code,
-        Matricula.holder_name,
-        Matricula.status,
-    ).join(Matricula, Matricula.id == Presenca.matricula_id)
+    )
 
     if code:
-        if not FORMAT.fullmatch(code):
+        if not valid:
             return jsonify(ok=False, error="invalid_code_format"), 400
-        q = q.filter(Matricula.code == code)
-    if start:
-        q = q.filter(Presenca.date_key >= start)
-    if end:
-        q = q.filter(Presenca.date_key <= end)
-
-    q = q.order_by(Presenca.date_key.desc(), Presenca.timestamp.desc())
-
-    # compat 2.x / 3.x
-    try:
-        page_obj = q.paginate(page=page, per_page=per_page, error_out=False)  # FSAlchemy 2.x
-    except AttributeError:
-        page_obj = db.paginate(q, page=page, per_page=per_page, error_out=False)  # 3.x
-
-    items = [{
-        "id": r.id,
-        "date_key": r.date_key.isoformat(),
-        "timestamp_utc": r.timestamp.isoformat(),
-        "code": r.code,
-        "holder_name": r.holder_name,
-        "status": r.status,
-        "ip": r.ip,
-        "source": r.source,
-    } for r in page_obj.items]
-
+        m = lookup_matricula(code)
+        if not m:
+            if legacy:
+                return jsonify(ok=True, total=0, page=page, pages=0, per_page=per_page, items=[]), 200
+            return jsonify(ok=True, per_page=per_page, has_more=False, next_cursor=None, items=[]), 200
+        q = q.filter(Presenca.matricula_id == m.id)
+    q = _filter_date_range(q, start, end)
+
+    if legacy:
+        q = q.order_by(Presenca.date_key.desc(), Presenca.timestamp.desc())
+        # compat 2.x / 3.x
+        try:
+            page_obj = q.paginate(page=page, per_page=per_page, error_out=False)  # FSAlchemy 2.x
+        except AttributeError:
+            page_obj = db.paginate(q, page=page, per_page=per_page, error_out=False)  # 3.x
+
+        return jsonify(
+            ok=True,
+            total=page_obj.total,
+            page=page_obj.page,
+            pages=page_obj.pages,
+            per_page=page_obj.per_page,
+            items=_presenca_items(page_obj.items)
+        ), 200
+
+    # Keyset ("seek"): continua após (date_key, timestamp, id) da última linha
+    # — sem OFFSET e sem COUNT(*); busca 1 a mais só p/ saber se há próxima.
+    if after:
+        q = q.filter(tuple_(Presenca.date_key, Presenca.timestamp, Presenca.id) < after)
+    q = q.order_by(Presenca.date_key.desc(), Presenca.timestamp.desc(), Presenca.id.desc())
+    rows = q.limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
     return jsonify(
         ok=True,
-        total=page_obj.total,
-        page=page_obj.page,
-        pages=page_obj.pages,
-        per_page=page_obj.per_page,
-        items=items
+        per_page=per_page,
+        has_more=has_more,
+        next_cursor=_encode_cursor(rows[-1]) if has_more else None,
+        items=_presenca_items(rows)
     ), 200
 
 # ===================== EXPORTS (CSV e JSON) =====================
@@ -238,10 +437,12 @@ def export_presencas_csv():
     end   = _parse_date(request.args.get("end"))
     code  = (request.args.get("code") or "").strip().upper()
 
+    # Datas já saem formatadas do banco (sem .isoformat() por linha)
+    date_txt, ts_txt = _iso_text_columns()
     q = db.session.query(
         Presenca.id,
-        Presenca.date_key,
-        Presenca.timestamp,
+        date_txt.label("date_key"),
+        ts_txt.label("timestamp_utc"),
         Matricula.code,
         Matricula.holder_name,
         Matricula.cpf,
@@ -250,35 +451,37 @@ def export_presencas_csv():
         Presenca.source,
     ).join(Matricula, Matricula.id == Presenca.matricula_id)
 
-    if start:
-        q = q.filter(Presenca.date_key >= start)
-    if end:
-        q = q.filter(Presenca.date_key <= end)
+    q = _filter_date_range(q, start, end)
     if code:
         q = q.filter(Matricula.code == code)
 
     q = q.order_by(Presenca.date_key.desc(), Presenca.timestamp.desc())
-    rows = q.all()
-
-    output = io.StringIO(newline="")
-    writer = csv.writer(output)
-    writer.writerow(["id", "date_key", "timestamp_utc", "code", "holder_name", "cpf", "status", "ip", "source"])
-    for r in rows:
-        writer.writerow([
-            r.id,
-            r.date_key.isoformat(),
-            r.timestamp.isoformat(),
-            r.code,
-            r.holder_name or "",
-            r.cpf or "",
-            r.status,
-            r.ip or "",
-            r.source or "",
-        ])
-
-    resp = Response(output.getvalue(), mimetype="text/csv; charset=utf-8")
-    resp.headers["Content-Disposition"] = "attachment; filename=presencas.csv"
-    return resp
+
+    # Exports grandes (sem código, intervalo aberto ou > COPY_EXPORT_MIN_DAYS):
+    # o Postgres monta o CSV inteiro via COPY
+    wide = not start or not end or (end - start).days > COPY_EXPORT_MIN_DAYS
+    if not code and wide and copy_supported():
+        return copy_csv_response(q.statement, "presencas.csv")
+
+    q = q.execution_options(stream_results=True).yield_per(1000)
+
+    rows = ((
+        r.id,
+        r.date_key,
+        r.timestamp_utc,
+        r.code,
+        r.holder_name or "",
+        r.cpf or "",
+        r.status,
+        r.ip or "",
+        r.source or "",
+    ) for r in q)
+
+    return csv_response(
+        ["id", "date_key", "timestamp_utc", "code", "holder_name", "cpf", "status", "ip", "source"],
+        rows,
+        "presencas.csv",
+    )
 
 @presenca_bp.get("/export.json")
 def export_presencas_json():
@@ -299,26 +502,28 @@ def export_presencas_json():
         Presenca.source,
     ).join(Matricula, Matricula.id == Presenca.matricula_id)
 
-    if start:
-        q = q.filter(Presenca.date_key >= start)
-    if end:
-        q = q.filter(Presenca.date_key <= end)
+    q = _filter_date_range(q, start, end)
     if code:
         q = q.filter(Matricula.code == code)
 
     q = q.order_by(Presenca.date_key.desc(), Presenca.timestamp.desc())
-    rows = q.all()
 
-    data = [{
+    # Uma única leitura: count e ETag saem das mesmas linhas do corpo. A ETag é
+    # o hash do corpo (como no /list.json): muda também quando só os campos da
+    # matrícula (nome, status, cpf) mudam, sem presença nova.
+    body = json_bytes([{
         "id": r.id,
-        "date_key": r.date_key.isoformat(),
-        "timestamp_utc": r.timestamp.isoformat(),
+        "date_key": r.date_key,
+        "timestamp_utc": r.timestamp,
         "code": r.code,
         "holder_name": r.holder_name,
         "cpf": r.cpf,
         "status": r.status,
         "ip": r.ip,
         "source": r.source,
-    } for r in rows]
+    } for r in q])
 
-    return jsonify({"count": len(data), "items": data}), 200
\ No newline at end of file
+    resp = Response(body, mimetype="application/json")
+    resp.set_etag(hashlib.blake2b(body, digest_size=8).hexdigest(), weak=True)
+    resp.headers["Cache-Control"] = "private, max-age=5"
+    return resp.make_conditional(request)
\ No newline at end of file
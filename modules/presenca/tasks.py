@@ -0,0 +1,198 @@
+# modules/presenca/tasks.py
+# -------------------------------------------------------------------
+# Jobs da fila "presenca" (RQ). Worker:
+#   rq worker presenca --url $PRESENCA_QUEUE_URL
+# A request só valida + marca no Redis e enfileira; o INSERT roda aqui.
+# Sem Redis: PresencaBatchWriter (lote numa thread do próprio processo).
+# -------------------------------------------------------------------
+import atexit
+import datetime as dt
+import queue
+import threading
+import time
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, Presenca
+
+# Opcional: RQ (só a fila usa; o PresencaBatchWriter funciona sem)
+try:
+    from rq import Retry
+except ModuleNotFoundError:
+    Retry = None
+
+# App criada 1x por processo do worker (o job roda fora de qualquer request)
+_app = None
+
+
+def _worker_app():
+    global _app
+    if _app is None:
+        from wsgi import app
+        _app = app
+    return _app
+
+
+def queued_key(matricula_id: int, date_key: dt.date) -> str:
+    """Chave Redis "presença de hoje já enfileirada" (SET NX na request)."""
+    return f"presenca:seen:{matricula_id}:{date_key.isoformat()}"
+
+
+def clear_queued_key(job, connection, type, value, traceback) -> None:
+    """
+    on_failure do job: apaga a trava para que a próxima tentativa do aluno
+    enfileire de novo (sem isso ela responderia "já registrada" sem linha no banco).
+    O RQ chama a cada tentativa que falha, mesmo com retry pendente: um job
+    duplicado é inofensivo (record_presenca é idempotente).
+    """
+    matricula_id, date_key = job.args[:2]
+    connection.delete(queued_key(matricula_id, date_key))
+
+
+def record_presenca(matricula_id: int, date_key: dt.date, timestamp: dt.datetime,
+                    ip, user_agent: str, source: str) -> None:
+    """INSERT ... ON CONFLICT (matricula_id, date_key) DO NOTHING (idempotente)."""
+    with _worker_app().app_context():
+        insert = pg_insert if db.session.get_bind().dialect.name == "postgresql" else sqlite_insert
+        stmt = (
+            insert(Presenca)
+            .values(matricula_id=matricula_id, date_key=date_key, timestamp=timestamp,
+                    ip=ip, user_agent=user_agent, source=source)
+            .on_conflict_do_nothing(index_elements=[Presenca.matricula_id, Presenca.date_key])
+        )
+        db.session.execute(stmt)
+        db.session.commit()
+
+
+# ===================== Gravação em lote (no próprio processo) =====================
+
+# Marcador na fila: a thread grava o lote em mãos e termina (ver flush)
+_STOP = object()
+
+class PresencaBatchWriter:
+    """
+    Alternativa à fila RQ sem Redis: as requests só enfileiram o dict da linha
+    e uma thread do processo grava em lote (até `max_rows` linhas ou a cada
+    `max_wait` s) num único INSERT multi-linha ... ON CONFLICT DO NOTHING.
+    A request responde "registrada" antes do COMMIT: no encerramento normal do
+    processo (deploy, max-requests do gunicorn) flush() grava o que restou no
+    buffer, mas um kill -9/OOM perde essas linhas. Por isso fica desligado por
+    padrão (PRESENCA_BATCH_WRITES=1 liga); use a fila RQ se isso não for aceitável.
+    """
+
+    def __init__(self, app, max_rows: int = 500, max_wait: float = 0.2):
+        self.app = app
+        self.max_rows = max_rows
+        self.max_wait = max_wait
+        self._queue = queue.SimpleQueue()
+        self._seen = set()          # (matricula_id, date_key) já aceitos/gravados hoje
+        self._seen_day = None
+        self._lock = threading.Lock()
+        self._thread = None         # criada na 1ª submissão (sobrevive ao fork do gunicorn)
+        # registrado antes do fork (--preload): vale para cada worker no exit
+        atexit.register(self.flush)
+
+    def _roll_day(self, date_key) -> None:
+        # chamado com o lock: o conjunto só vale para o dia corrente
+        if self._seen_day != date_key:
+            self._seen.clear()
+            self._seen_day = date_key
+
+    def seen(self, matricula_id: int, date_key: dt.date) -> bool:
+        """Presença do dia já conhecida neste processo (dispensa o SELECT)?"""
+        with self._lock:
+            return self._seen_day == date_key and (matricula_id, date_key) in self._seen
+
+    def remember(self, matricula_id: int, date_key: dt.date) -> None:
+        """Marca como conhecida uma presença que já está no banco."""
+        with self._lock:
+            self._roll_day(date_key)
+            self._seen.add((matricula_id, date_key))
+
+    def submit(self, row: dict) -> bool:
+        """Enfileira a linha; False se (matricula_id, date_key) já foi aceito neste processo."""
+        key = (row["matricula_id"], row["date_key"])
+        with self._lock:
+            self._roll_day(row["date_key"])
+            if key in self._seen:
+                return False
+            self._seen.add(key)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="presenca-writer", daemon=True)
+                self._thread.start()
+        self._queue.put(row)
+        return True
+
+    def _drain(self):
+        """(lote, parar?) — parar quando flush() colocou _STOP na fila."""
+        first = self._queue.get()  # bloqueia até a 1ª linha
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_rows:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                row = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if row is _STOP:
+                return batch, True
+            batch.append(row)
+        return batch, False
+
+    def _forget(self, batch: list) -> None:
+        # lote não gravado: tira as chaves do conjunto para que a próxima
+        # request da mesma matrícula no dia seja gravada de novo
+        with self._lock:
+            for row in batch:
+                self._seen.discard((row["matricula_id"], row["date_key"]))
+
+    def _write(self, batch: list) -> None:
+        with self.app.app_context():
+            try:
+                insert = pg_insert if db.engine.dialect.name == "postgresql" else sqlite_insert
+                stmt = insert(Presenca).on_conflict_do_nothing(
+                    index_elements=[Presenca.matricula_id, Presenca.date_key]
+                )
+                # executemany -> INSERT multi-linha (insertmanyvalues do SQLAlchemy 2)
+                db.session.execute(stmt, batch)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self._forget(batch)
+                self.app.logger.exception("Falha ao gravar lote de %d presenças", len(batch))
+
+    def _run(self) -> None:
+        while True:
+            batch, stop = self._drain()
+            if batch:
+                self._write(batch)
+            if stop:
+                return
+
+    def flush(self, timeout: float = 10.0) -> None:
+        """
+        Grava o que ainda está no buffer (encerramento do processo): a thread
+        recebe _STOP, grava o lote que já tinha em mãos e termina; sem thread
+        viva, grava aqui mesmo o que restou na fila.
+        """
+        with self._lock:
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+            return
+        batch = []
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is not _STOP:
+                batch.append(row)
+        if batch:
+            self._write(batch)
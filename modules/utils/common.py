@@ -1,7 +1,8 @@
 import math
-from functools import wraps
+from functools import lru_cache, wraps
 from flask import request, jsonify, current_app
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+import numpy as np
 import pandas as pd
 
 # ============================
@@ -56,6 +57,12 @@ COL_SEGMENTO = "Cotas Id Cliente → Segmento"
 def _safe_div(a, b):
     return float(a) / float(b) if b not in (0, 0.0, None) else None
 
+def _safe_div_cols(num, den) -> np.ndarray:
+    """_safe_div vetorizado (coluna a coluna): NaN onde o denominador é 0."""
+    num = np.asarray(num, dtype="float64")
+    den = np.asarray(den, dtype="float64")
+    return np.divide(num, den, out=np.full(num.shape, np.nan), where=den != 0)
+
 def _to_millions(x):
     return float(x) / 1_000_000 if pd.notna(x) else None
 
@@ -70,6 +77,18 @@ def _jround(x, nd=2):
     except Exception:
         return None
 
+def _jround_col(values, nd=2) -> list:
+    """_jround da coluna inteira -> lista Python (None onde não é finito)."""
+    arr = np.asarray(values, dtype="float64")
+    ok = np.isfinite(arr).tolist()
+    return [round(v, nd) if k else None for v, k in zip(arr.tolist(), ok)]
+
+def _int_col(values) -> list:
+    """Coluna de contagens -> lista de int Python."""
+    return np.asarray(values, dtype="int64").tolist()
+
+_TRUTHY = frozenset({"sim", "s", "pago", "paga", "true", "1", "yes", "y"})
+
 def _is_paid(v) -> bool:
     if isinstance(v, (bool, int, float)):
         try:
@@ -77,30 +96,60 @@ def _is_paid(v) -> bool:
         except Exception:
             return bool(v)
     s = str(v).strip().lower().replace("não", "nao")
-    return s in {"sim", "s", "pago", "paga", "true", "1", "yes", "y"}
+    return s in _TRUTHY
+
+def _paid_mask(col: pd.Series) -> np.ndarray:
+    """
+    _is_paid aplicado à coluna inteira (máscara booleana), com operações
+    vetorizadas do pandas/NumPy em vez de uma chamada Python por linha.
+    """
+    if col.dtype.kind in "biuf":
+        # bool(int(v)); NaN/inf caem no bool(v) -> True, como em _is_paid
+        vals = col.to_numpy(dtype="float64")
+        return np.isnan(vals) | (np.trunc(vals) != 0)
+    if pd.api.types.infer_dtype(col, skipna=True) not in ("string", "empty"):
+        # coluna mista (texto + números/bools): regra exata linha a linha
+        return col.map(_is_paid).to_numpy(dtype=bool)
+    mask = (
+        col.str.strip().str.lower().str.replace("não", "nao", regex=False)
+        .isin(_TRUTHY).to_numpy(dtype=bool, copy=True)
+    )
+    na = col.isna().to_numpy()
+    if na.any():
+        # _is_paid(NaN) é True (bool(nan)); None/pd.NA continuam False
+        mask[na] = [isinstance(v, float) for v in col.to_numpy()[na]]
+    return mask
+
+# apelidos (snake_case) -> nome canônico da coluna
+ALT_MAP = {
+    "ano_nascimento": COL_ANO_NASC,
+    "uf_cliente": COL_UF,
+    "cidade": COL_CIDADE,
+    "data_producao": "Cotas Id Cliente → Data Producao",
+    "segmento_bacen": "Cotas Id Cliente → Segmento Bacen",
+    "id_cota": COL_ID_COTA,
+    "segmento": COL_SEGMENTO,
+    "tem_pagamento": COL_TEM_PAGTO,
+    "nome_ponto_venda": "Cotas Id Cliente → Nome Ponto Venda",
+    "id_pessoa": "Cotas Id Cliente → Id Pessoa",
+    "codigo_ponto_venda": "Cotas Id Cliente → Codigo Ponto Venda",
+    "producao_oficial": "Cotas Id Cliente → Producao Oficial",
+    "valor_credito_venda": COL_VALOR,
+    "data_venda": COL_DATA_VENDA,
+}
+
+def _norm_column(c) -> str:
+    c = str(c).replace("->", "→")
+    c = " ".join(c.split())
+    return c.strip()
+
+@lru_cache(maxsize=64)
+def _column_names(cols: tuple) -> tuple:
+    # mesmo cabeçalho (payloads da Workato) -> nomes já normalizados
+    return tuple(ALT_MAP.get(n, n) for n in map(_norm_column, cols))
 
 def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
-    def norm(c):
-        c = str(c).replace("->", "→")
-        c = " ".join(c.split())
-        return c.strip()
-    df = df.copy()
-    df.columns = [norm(c) for c in df.columns]
-    ALT_MAP = {
-        "ano_nascimento": COL_ANO_NASC,
-        "uf_cliente": COL_UF,
-        "cidade": COL_CIDADE,
-        "data_producao": "Cotas Id Cliente → Data Producao",
-        "segmento_bacen": "Cotas Id Cliente → Segmento Bacen",
-        "id_cota": COL_ID_COTA,
-        "segmento": COL_SEGMENTO,
-        "tem_pagamento": COL_TEM_PAGTO,
-        "nome_ponto_venda": "Cotas Id Cliente → Nome Ponto Venda",
-        "id_pessoa": "Cotas Id Cliente → Id Pessoa",
-        "codigo_ponto_venda": "Cotas Id Cliente → Codigo Ponto Venda",
-        "producao_oficial": "Cotas Id Cliente → Producao Oficial",
-        "valor_credito_venda": COL_VALOR,
-        "data_venda": COL_DATA_VENDA,
-    }
-    df.columns = [ALT_MAP.get(c, c) for c in df.columns]
-    return df
\ No newline at end of file
+    # cópia rasa: só o índice de colunas muda, os dados são compartilhados
+    df = df.copy(deep=False)
+    df.columns = list(_column_names(tuple(df.columns)))
+    return df
@@ -0,0 +1,128 @@
+# modules/utils/export.py
+# -----------------------------------------------------------------------------
+# Exportação CSV em streaming (sem materializar o resultado inteiro em memória)
+# -----------------------------------------------------------------------------
+import csv
+import io
+from itertools import chain
+
+from flask import Response, current_app, stream_with_context
+
+from models import db
+
+# Envia um pedaço ao cliente quando o buffer passa deste tamanho
+_CHUNK_BYTES = 8192
+# COPY devolve uma linha por vez: agrupa em blocos maiores antes de enviar
+_COPY_CHUNK_BYTES = 64 * 1024
+
+
+def _csv_chunks(header, rows):
+    """
+    Caminho rápido: códigos/CPFs/datas quase nunca precisam de aspas, então a
+    linha sai com um simples ",".join; só as linhas com , " ou quebra de linha
+    passam pelo csv.writer (saída idêntica à do writer em ambos os casos).
+    Os pedaços saem já em bytes UTF-8 (1 encode a cada ~8 KiB, não por linha).
+    """
+    slow = io.StringIO(newline="")
+    writer = csv.writer(slow)
+    parts, size = [], 0
+    seps = len(header) - 1
+
+    for row in chain((header,), rows):
+        fields = ["" if v is None else str(v) for v in row]
+        line = ",".join(fields)
+        # vírgula extra, aspas ou quebra de linha em algum campo? (varreduras em C)
+        if line.count(",") != seps or '"' in line or "\n" in line or "\r" in line:
+            writer.writerow(fields)
+            line = slow.getvalue()
+            slow.seek(0)
+            slow.truncate()
+        else:
+            line += "\r\n"
+        parts.append(line)
+        size += len(line)
+        if size > _CHUNK_BYTES:
+            yield "".join(parts).encode()
+            parts, size = [], 0
+    yield "".join(parts).encode()
+
+
+def csv_response(header, rows, filename: str) -> Response:
+    """
+    Resposta text/csv em streaming.
+    `rows` deve ser um iterável preguiçoso (ex.: execute() com yield_per);
+    a sessão permanece aberta durante o envio via stream_with_context.
+    """
+    return Response(
+        stream_with_context(_csv_chunks(header, rows)),
+        mimetype="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+def copy_supported() -> bool:
+    """COPY ... TO STDOUT só no Postgres via psycopg3 (cursor.copy)."""
+    dialect = db.session.get_bind().dialect
+    return dialect.name == "postgresql" and dialect.driver == "psycopg"
+
+
+def _copy_chunks(sql: str):
+    # Usa a mesma conexão da sessão (mantida aberta por stream_with_context)
+    raw = db.session.connection().connection.driver_connection
+    parts, size = [], 0
+    with raw.cursor() as cur, cur.copy(sql) as copy:
+        for block in copy:
+            parts.append(bytes(block))
+            size += len(block)
+            if size > _COPY_CHUNK_BYTES:
+                yield b"".join(parts)
+                parts, size = [], 0
+    yield b"".join(parts)
+
+
+def copy_csv_response(stmt, filename: str) -> Response:
+    """
+    Resposta text/csv gerada pelo próprio Postgres:
+    COPY (<stmt>) TO STDOUT WITH (FORMAT csv, HEADER) — o CSV é montado em C
+    no servidor e os bytes vão direto para o cliente, sem loop Python por linha.
+    O cabeçalho sai dos nomes/labels das colunas do SELECT.
+    Chamar só quando copy_supported() for verdadeiro.
+    """
+    # COPY não aceita bind params: parâmetros viram literais (datas/strings já validadas)
+    select_sql = stmt.compile(
+        dialect=db.session.get_bind().dialect,
+        compile_kwargs={"literal_binds": True},
+    )
+    sql = f"COPY ({select_sql}) TO STDOUT WITH (FORMAT csv, HEADER)"
+    return Response(
+        stream_with_context(_copy_chunks(sql)),
+        mimetype="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+def _json_chunks(count, items, dumpb):
+    # {"count": N, "items": [ ... ]} montado aos pedaços, um item por vez,
+    # direto em bytes (orjson já devolve bytes: sem encode extra)
+    parts = [b'{"count":%d,"items":[' % count]
+    size = 0
+    sep = b""
+    for item in items:
+        part = sep + dumpb(item)
+        sep = b","
+        parts.append(part)
+        size += len(part)
+        if size > _CHUNK_BYTES:
+            yield b"".join(parts)
+            parts, size = [], 0
+    parts.append(b"]}\n")
+    yield b"".join(parts)
+
+
+def json_bytes(items: list) -> bytes:
+    """
+    Corpo {"count": N, "items": [...]} já serializado, com N = len(items)
+    (contagem sai do mesmo resultado que vai no corpo). Cada item passa pelo
+    provider JSON da app (orjson quando disponível).
+    """
+    return b"".join(_json_chunks(len(items), items, current_app.json.dumpb))
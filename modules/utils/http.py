@@ -0,0 +1,45 @@
+# modules/utils/http.py
+# -----------------------------------------------------------------------------
+# Leitura enxuta do corpo JSON das APIs
+# -----------------------------------------------------------------------------
+from flask import current_app, jsonify, request
+
+
+def small_json_body(max_bytes: int = 4096):
+    """
+    Lê um corpo JSON pequeno sem passar por request.get_json.
+    Rejeita (413) corpos acima de max_bytes antes de parsear; corpo que não é
+    JSON (content-type ou conteúdo) vira {} como no get_json(silent=True).
+    Retorna (dados, None) ou (None, resposta_de_erro).
+    """
+    length = request.content_length
+    if length is not None and length > max_bytes:
+        return None, (jsonify(ok=False, message="Corpo da requisição muito grande."), 413)
+    if not request.is_json:
+        return {}, None
+    raw = request.stream.read(max_bytes + 1)
+    if len(raw) > max_bytes:
+        return None, (jsonify(ok=False, message="Corpo da requisição muito grande."), 413)
+    try:
+        data = current_app.json.loads(raw) if raw else {}
+    except ValueError:
+        return {}, None
+    return (data if isinstance(data, dict) else {}), None
+
+
+def json_body():
+    """
+    request.get_json(silent=True) sem guardar o corpo na request: os bytes são
+    lidos 1x (get_data(cache=False)) e vão direto para o provider JSON da app.
+    None se o content-type não for JSON ou o corpo for inválido.
+    Só chamar uma vez por request (o stream não é relido).
+    """
+    if not request.is_json:
+        return None
+    raw = request.get_data(cache=False)
+    if not raw:
+        return None
+    try:
+        return current_app.json.loads(raw)
+    except ValueError:
+        return None
@@ -0,0 +1,63 @@
+# modules/utils/matriculas.py
+# -----------------------------------------------------------------------------
+# Cache de leitura das matrículas por código (compartilhado entre blueprints)
+# -----------------------------------------------------------------------------
+import threading
+
+from cachetools import TTLCache
+from sqlalchemy import bindparam, select
+
+from models import db, Matricula
+
+# code -> Row(id, code, status, holder_name, cpf); só guarda acertos
+_MATRICULA_CACHE = TTLCache(maxsize=10_000, ttl=60)
+_LOCK = threading.Lock()
+
+# Statement montado 1x (chave estável no cache de compilação do SQLAlchemy)
+_BY_CODE = (
+    select(Matricula.id, Matricula.code, Matricula.status,
+           Matricula.holder_name, Matricula.cpf)
+    .where(Matricula.code == bindparam("code"))
+    .limit(1)
+)
+
+
+def is_code(code: str) -> bool:
+    """Padrão MR + 5 dígitos ASCII (sem passar pelo regex; só comparações em C)."""
+    return (len(code) == 7 and code.isascii()
+            and code[0] == "M" and code[1] == "R" and code[2:].isdigit())
+
+
+def normalize_code(raw):
+    """
+    strip + upper do código vindo da request -> (code, válido?).
+    O caso comum já chega em maiúsculas: só faz .upper() se o formato falhar.
+    """
+    code = (raw or "").strip()
+    if is_code(code):
+        return code, True
+    code = code.upper()
+    return code, is_code(code)
+
+
+def lookup_matricula(code: str):
+    """
+    Busca (id, code, status, holder_name, cpf) pelo código.
+    Retorna uma Row (tupla, sem instância ORM) ou None se não existir.
+    """
+    with _LOCK:
+        row = _MATRICULA_CACHE.get(code)
+    if row is not None:
+        return row
+
+    row = db.session.execute(_BY_CODE, {"code": code}).first()
+    if row is not None:
+        with _LOCK:
+            _MATRICULA_CACHE[code] = row
+    return row
+
+
+def forget_matricula(code: str) -> None:
+    """Remove o código do cache (chamar após alterar a matrícula)."""
+    with _LOCK:
+        _MATRICULA_CACHE.pop(code, None)
@@ -0,0 +1,106 @@
+# modules/utils/pages.py
+# -----------------------------------------------------------------------------
+# Templates HTML compilados 1x por processo (fora do caminho quente)
+# -----------------------------------------------------------------------------
+import gzip
+import hashlib
+import re
+import threading
+
+from cachetools import LRUCache
+from flask import Response, current_app, request
+
+# nome do template -> jinja2.Template já compilado
+_TEMPLATES = {}
+
+# Formulários vazios são iguais para todos: browser/CDN podem reaproveitar
+STATIC_CACHE_CONTROL = "public, max-age=300"
+
+# Indentação/linhas em branco entre tags (os templates não usam <pre>/<textarea>)
+_LEADING_WS = re.compile(r"\n\s+")
+
+
+def page_template(name: str):
+    """Template compilado (carregado do jinja_env só na 1ª chamada)."""
+    tmpl = _TEMPLATES.get(name)
+    if tmpl is None:
+        tmpl = _TEMPLATES[name] = current_app.jinja_env.get_template(name)
+    return tmpl
+
+
+def _minify(html: str) -> str:
+    """Remove a indentação do início das linhas (mantém as quebras: JS/CSS seguem válidos)."""
+    if "<pre" in html or "<textarea" in html:
+        return html
+    return _LEADING_WS.sub("\n", html).strip()
+
+
+def _prerender(name: str, ctx: dict):
+    """(html, html gzip) minificados e prontos para reenviar sem Jinja nem compressão."""
+    html = _minify(page_template(name).render(**ctx)).encode()
+    return html, gzip.compress(html, compresslevel=9)
+
+
+def _send(page, cache_control: str) -> Response:
+    html, gz = page
+    if request.accept_encodings["gzip"]:
+        resp = Response(gz, mimetype="text/html")
+        resp.headers["Content-Encoding"] = "gzip"
+    else:
+        resp = Response(html, mimetype="text/html")
+    resp.headers["Cache-Control"] = cache_control
+    resp.vary.add("Accept-Encoding")
+    return resp
+
+
+def render_page(name: str, status: int = 200, **ctx) -> Response:
+    """
+    Renderiza direto no Template compilado (sem render_template).
+    url_for/request/config continuam disponíveis: são globals do jinja_env.
+    Pode conter dados pessoais (nome/código): nunca vai para cache.
+    """
+    resp = Response(page_template(name).render(**ctx), status=status, mimetype="text/html")
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+# (nome, chave) -> (html, html gzip); páginas que só variam por um parâmetro curto
+_KEYED = LRUCache(maxsize=4096)
+_KEYED_LOCK = threading.Lock()
+
+
+def keyed_page(name: str, key: str, **ctx) -> Response:
+    """
+    Página que só depende de `key` (ex.: ?code= da página de sucesso):
+    minificada + gzip 1x por chave (LRU) e reenviada pronta nas próximas vezes.
+    `ctx` deve ser função de `key`. Sai com no-store, como render_page.
+    """
+    with _KEYED_LOCK:
+        page = _KEYED.get((name, key))
+    if page is None:
+        page = _prerender(name, ctx)
+        with _KEYED_LOCK:
+            _KEYED[(name, key)] = page
+    return _send(page, "no-store")
+
+
+# nome do template -> (html, html gzip, etag) (páginas sem contexto por request)
+_STATIC = {}
+
+
+def static_page(name: str, **ctx) -> Response:
+    """
+    Página que não depende da request (formulário vazio): renderiza 1x por
+    processo e depois só devolve os bytes prontos (gzip se o cliente aceitar),
+    sem passar pelo Jinja. `ctx` deve ser constante para o mesmo `name`.
+    Sai com Cache-Control público + ETag; If-None-Match igual -> 304.
+    """
+    page = _STATIC.get(name)
+    if page is None:
+        html, gz = _prerender(name, ctx)
+        page = _STATIC[name] = (html, gz, hashlib.blake2b(html, digest_size=8).hexdigest())
+    html, gz, etag = page
+    resp = _send((html, gz), STATIC_CACHE_CONTROL)
+    # ETag por representação (gzip ou não), como pede o Vary
+    resp.set_etag(etag + "-gz" if resp.headers.get("Content-Encoding") else etag)
+    return resp.make_conditional(request)
@@ -1,51 +1,81 @@
 import pandas as pd
 from flask import current_app
 from modules.utils.common import (
-    normalize_columns, _is_paid, _safe_div, _to_millions, _jround,
+    normalize_columns, _paid_mask, _safe_div, _safe_div_cols, _to_millions, _jround, _jround_col, _int_col,
     COL_UF, COL_DATA_VENDA, COL_VALOR, COL_ID_COTA, COL_TEM_PAGTO, COL_SEGMENTO
 )
 
+def _parse_data_venda(col: pd.Series) -> pd.Series:
+    """
+    Datas da Workato (ISO 8601) pelo parser rápido do pandas; só o que não for
+    ISO (ex.: 'DD/MM/YYYY') passa pela inferência de formato, como antes.
+    """
+    parsed = pd.to_datetime(col, utc=True, errors="coerce", format="ISO8601", cache=True)
+    resto = parsed.isna() & col.notna()
+    if resto.any():
+        parsed[resto] = pd.to_datetime(col[resto], utc=True, errors="coerce")
+    return parsed
+
 def calcular_metricas(df: pd.DataFrame, *, dedup: int | None = None) -> dict:
+    """
+    Métricas de venda/produção da Workato. Listas da saída já vêm ordenadas:
+    "monthly" por mes, "cotas_pagas_por_uf" por UF e
+    "cotas_pagas_por_segmento_mes" por (mes, segmento).
+    """
     df = normalize_columns(df)
     required = [COL_DATA_VENDA, COL_VALOR, COL_TEM_PAGTO, COL_UF, COL_ID_COTA]
     faltando = [c for c in required if c not in df.columns]
     if faltando:
         raise ValueError(f"Colunas obrigatórias ausentes: {faltando}. Recebido: {list(df.columns)}")
 
-    df = df.copy()
-    df[COL_DATA_VENDA] = pd.to_datetime(df[COL_DATA_VENDA], utc=True, errors="coerce")
+    # normalize_columns já devolveu um DataFrame próprio (cópia rasa): trocar
+    # colunas inteiras aqui não altera o do chamador e não copia as demais
+    df[COL_DATA_VENDA] = _parse_data_venda(df[COL_DATA_VENDA])
     df[COL_VALOR] = pd.to_numeric(df[COL_VALOR], errors="coerce")
     df[COL_ID_COTA] = df[COL_ID_COTA].astype(str).str.strip()
+    # "mes" antes do filtro: o filtro abaixo já gera um DataFrame novo
+    # (to_period é vetorizado; .dt.strftime formata célula a célula e é bem mais lento)
+    df["mes"] = df[COL_DATA_VENDA].dt.to_period("M").astype(str)
+    # chaves de groupby com poucos valores: categóricas (agrupa por código
+    # inteiro em vez de hashear strings); groupbys abaixo usam observed=True
+    for col in ("mes", COL_UF, COL_SEGMENTO):
+        if col in df.columns:
+            df[col] = df[col].astype("category")
 
     period_start = current_app.config["PERIOD_START"]
-    df = df[df[COL_DATA_VENDA] >= period_start].copy()
+    df = df[df[COL_DATA_VENDA] >= period_start]
 
     if dedup is None:
         dedup = int(current_app.config["DEDUP_BY_ID"])
     if dedup == 1:
-        df = df.sort_values(COL_DATA_VENDA).drop_duplicates(subset=[COL_ID_COTA], keep="last")
+        # venda mais recente de cada cota: agregação por hash (sem ordenar o DataFrame todo)
+        df = df.loc[df.groupby(COL_ID_COTA, sort=False)[COL_DATA_VENDA].idxmax()]
 
-    df["mes"] = df[COL_DATA_VENDA].dt.to_period("M").astype(str)
     mes_ref_atual = pd.Timestamp.now(tz="America/Sao_Paulo").strftime("%Y-%m")
 
-    # vendas
-    vendas = df.groupby("mes").agg({COL_VALOR: "sum"}).rename(columns={COL_VALOR: "Venda_RS"})
-    venda_qtde = df.groupby("mes")[COL_ID_COTA].nunique() if dedup == 1 else df.groupby("mes")[COL_ID_COTA].size()
-    vendas["Venda_Qtde"] = venda_qtde
+    # contagem de cotas: distintas com dedup, linhas sem
+    qtde = "nunique" if dedup == 1 else "size"
+
+    # vendas (soma + contagem num único groupby)
+    # groupby ordena pelas categorias de "mes" (criadas já em ordem "YYYY-MM"):
+    # "monthly" sai em ordem cronológica e quem consome não precisa reordenar
+    vendas = df.groupby("mes", observed=True).agg(Venda_RS=(COL_VALOR, "sum"), Venda_Qtde=(COL_ID_COTA, qtde))
 
     # pagas
-    pagas = df[df[COL_TEM_PAGTO].apply(_is_paid)].copy()
-    producao = pagas.groupby("mes").agg({COL_VALOR: "sum"}).rename(columns={COL_VALOR: "Prod_RS"})
-    prod_qtde = pagas.groupby("mes")[COL_ID_COTA].nunique() if dedup == 1 else pagas.groupby("mes")[COL_ID_COTA].size()
-    producao["Prod_Qtde"] = prod_qtde
+    pagas = df[_paid_mask(df[COL_TEM_PAGTO])]
+    producao = pagas.groupby("mes", observed=True).agg(Prod_RS=(COL_VALOR, "sum"), Prod_Qtde=(COL_ID_COTA, qtde))
 
     # métricas
     resultado = vendas.join(producao, how="left").fillna(0.0)
-    resultado["Conv_RS_%"] = resultado.apply(lambda r: _safe_div(r["Prod_RS"], r["Venda_RS"]), axis=1)
-    resultado["Conv_Qtde_%"] = resultado.apply(lambda r: _safe_div(r["Prod_Qtde"], r["Venda_Qtde"]), axis=1)
-    resultado["Ticket_Medio"] = resultado.apply(lambda r: _safe_div(r["Prod_RS"], r["Prod_Qtde"]), axis=1)
-    resultado["Venda_RS_M"] = resultado["Venda_RS"].map(_to_millions)
-    resultado["Prod_RS_M"] = resultado["Prod_RS"].map(_to_millions)
+    # divisões coluna a coluna (NumPy), sem callback Python por linha
+    prod_rs = resultado["Prod_RS"].to_numpy(dtype="float64")
+    venda_rs = resultado["Venda_RS"].to_numpy(dtype="float64")
+    prod_qtde = resultado["Prod_Qtde"].to_numpy(dtype="float64")
+    resultado["Conv_RS_%"] = _safe_div_cols(prod_rs, venda_rs)
+    resultado["Conv_Qtde_%"] = _safe_div_cols(prod_qtde, resultado["Venda_Qtde"])
+    resultado["Ticket_Medio"] = _safe_div_cols(prod_rs, prod_qtde)
+    resultado["Venda_RS_M"] = venda_rs / 1_000_000
+    resultado["Prod_RS_M"] = prod_rs / 1_000_000
 
     # YTD
     venda_total_qtde = int(df[COL_ID_COTA].nunique()) if dedup == 1 else int(len(df))
@@ -56,65 +86,80 @@ def calcular_metricas(df: pd.DataFrame, *, dedup: int | None = None) -> dict:
     conv_anual_rs   = _safe_div(prod_total_rs, venda_total_rs)
 
     # UF total
-    por_uf_q = pagas.groupby(COL_UF)[COL_ID_COTA].nunique() if dedup == 1 else pagas.groupby(COL_UF)[COL_ID_COTA].size()
-    por_uf_rs = pagas.groupby(COL_UF)[COL_VALOR].sum()
-    por_uf = pd.concat([por_uf_q.rename("Cotas_Pagas_Qtde"), por_uf_rs.rename("Cotas_Pagas_RS")], axis=1)
-    por_uf["Cotas_Pagas_RS_M"] = por_uf["Cotas_Pagas_RS"].map(_to_millions)
+    por_uf = pagas.groupby(COL_UF, observed=True).agg(
+        Cotas_Pagas_Qtde=(COL_ID_COTA, qtde), Cotas_Pagas_RS=(COL_VALOR, "sum")
+    )
+    por_uf["Cotas_Pagas_RS_M"] = por_uf["Cotas_Pagas_RS"] / 1_000_000
 
     # UF mês corrente
-    pagas_mes = pagas[pagas["mes"] == mes_ref_atual].copy()
-    por_uf_mes_q = pagas_mes.groupby(COL_UF)[COL_ID_COTA].nunique() if dedup == 1 else pagas_mes.groupby(COL_UF)[COL_ID_COTA].size()
-    por_uf_mes_rs = pagas_mes.groupby(COL_UF)[COL_VALOR].sum()
-    por_uf_mes = pd.concat([por_uf_mes_q.rename("Cotas_Pagas_Qtde"), por_uf_mes_rs.rename("Cotas_Pagas_RS")], axis=1).reset_index()
+    pagas_mes = pagas[pagas["mes"] == mes_ref_atual]
+    por_uf_mes = pagas_mes.groupby(COL_UF, observed=True).agg(
+        Cotas_Pagas_Qtde=(COL_ID_COTA, qtde), Cotas_Pagas_RS=(COL_VALOR, "sum")
+    ).reset_index()
 
     # Segmento x Mês
     if COL_SEGMENTO in df.columns:
-        seg_q = pagas.groupby(["mes", COL_SEGMENTO])[COL_ID_COTA].nunique() if dedup == 1 else pagas.groupby(["mes", COL_SEGMENTO])[COL_ID_COTA].size()
-        seg_rs = pagas.groupby(["mes", COL_SEGMENTO])[COL_VALOR].sum()
-        seg_mes = pd.concat([seg_q.rename("Qtde"), seg_rs.rename("RS")], axis=1).reset_index()
-        seg_mes["RS_M"] = seg_mes["RS"].map(_to_millions)
+        seg_mes = pagas.groupby(["mes", COL_SEGMENTO], observed=True).agg(
+            Qtde=(COL_ID_COTA, qtde), RS=(COL_VALOR, "sum")
+        ).reset_index()
+        seg_mes["RS_M"] = seg_mes["RS"] / 1_000_000
         pagas_por_segmento_mes = [
-            {"mes": r["mes"], "segmento": r[COL_SEGMENTO], "qtde": int(r["Qtde"]), "rs": _jround(r["RS"], 2), "rs_m": _jround(r["RS_M"], 6)}
-            for _, r in seg_mes.iterrows()
+            {"mes": m, "segmento": seg, "qtde": q, "rs": rs, "rs_m": rs_m}
+            for m, seg, q, rs, rs_m in zip(
+                seg_mes["mes"].tolist(), seg_mes[COL_SEGMENTO].tolist(), _int_col(seg_mes["Qtde"]),
+                _jround_col(seg_mes["RS"], 2), _jround_col(seg_mes["RS_M"], 6),
+            )
         ]
     else:
         pagas_por_segmento_mes = []
 
-    # monthly
-    monthly = []
-    if not resultado.empty:
-        for _, row in resultado.reset_index().iterrows():
-            monthly.append({
-                "mes": row["mes"],
-                "venda_rs": _jround(row["Venda_RS"], 2),
-                "venda_qtde": int(row["Venda_Qtde"]),
-                "prod_rs": _jround(row["Prod_RS"], 2),
-                "prod_qtde": int(row["Prod_Qtde"]),
-                "conv_rs_pct": _jround(row["Conv_RS_%"], 6),
-                "conv_qtde_pct": _jround(row["Conv_Qtde_%"], 6),
-                "ticket_medio": _jround(row["Ticket_Medio"], 2),
-                "venda_rs_m": _jround(row["Venda_RS_M"], 6),
-                "prod_rs_m": _jround(row["Prod_RS_M"], 6),
-            })
-
-    uf_list = []
-    if not por_uf.empty:
-        for _, row in por_uf.reset_index().iterrows():
-            uf_list.append({
-                "uf": row[COL_UF],
-                "cotas_pagas_qtde": int(row["Cotas_Pagas_Qtde"]),
-                "cotas_pagas_rs": _jround(row["Cotas_Pagas_RS"], 2),
-                "cotas_pagas_rs_m": _jround(row.get("Cotas_Pagas_RS_M"), 6),
-            })
-
-    uf_mes_list = []
-    if not por_uf_mes.empty:
-        for _, r in por_uf_mes.iterrows():
-            uf_mes_list.append({
-                "uf": r[COL_UF],
-                "cotas_pagas_qtde": int(r["Cotas_Pagas_Qtde"]),
-                "cotas_pagas_rs": _jround(r["Cotas_Pagas_RS"], 2),
-            })
+    # listas de saída montadas coluna a coluna (sem iterrows / Series por linha)
+    monthly = [
+        {
+            "mes": m,
+            "venda_rs": venda_rs,
+            "venda_qtde": venda_qtde,
+            "prod_rs": prod_rs,
+            "prod_qtde": prod_qtde,
+            "conv_rs_pct": conv_rs,
+            "conv_qtde_pct": conv_qtde,
+            "ticket_medio": ticket,
+            "venda_rs_m": venda_rs_m,
+            "prod_rs_m": prod_rs_m,
+        }
+        for m, venda_rs, venda_qtde, prod_rs, prod_qtde, conv_rs, conv_qtde, ticket, venda_rs_m, prod_rs_m
+        in zip(
+            resultado.index.tolist(),
+            _jround_col(resultado["Venda_RS"], 2),
+            _int_col(resultado["Venda_Qtde"]),
+            _jround_col(resultado["Prod_RS"], 2),
+            _int_col(resultado["Prod_Qtde"]),
+            _jround_col(resultado["Conv_RS_%"], 6),
+            _jround_col(resultado["Conv_Qtde_%"], 6),
+            _jround_col(resultado["Ticket_Medio"], 2),
+            _jround_col(resultado["Venda_RS_M"], 6),
+            _jround_col(resultado["Prod_RS_M"], 6),
+        )
+    ]
+
+    uf_list = [
+        {"uf": uf, "cotas_pagas_qtde": q, "cotas_pagas_rs": rs, "cotas_pagas_rs_m": rs_m}
+        for uf, q, rs, rs_m in zip(
+            por_uf.index.tolist(),
+            _int_col(por_uf["Cotas_Pagas_Qtde"]),
+            _jround_col(por_uf["Cotas_Pagas_RS"], 2),
+            _jround_col(por_uf["Cotas_Pagas_RS_M"], 6),
+        )
+    ]
+
+    uf_mes_list = [
+        {"uf": uf, "cotas_pagas_qtde": q, "cotas_pagas_rs": rs}
+        for uf, q, rs in zip(
+            por_uf_mes[COL_UF].tolist(),
+            _int_col(por_uf_mes["Cotas_Pagas_Qtde"]),
+            _jround_col(por_uf_mes["Cotas_Pagas_RS"], 2),
+        )
+    ]
 
     return {
         "status": "ok",
@@ -2,10 +2,15 @@
 # -----------------------------------------------------------------------------
 # Módulo Workato — rotas de integração e testes
 # -----------------------------------------------------------------------------
-from flask import Blueprint, request, jsonify, current_app
+import hmac
+
+from flask import Blueprint, Response, request, jsonify, current_app
+
+from modules.utils.http import json_body
 
 workato_bp = Blueprint("workato", __name__)
 
+
 # -----------------------------------------------------------------------------
 # Rota simples de teste (GET /workato/test)
 # -----------------------------------------------------------------------------
@@ -27,24 +32,46 @@ def test():
 # -----------------------------------------------------------------------------
 # Rota de trigger (POST /workato/trigger)
 # -----------------------------------------------------------------------------
+TRIGGER_NOTE = "Este endpoint é um exemplo. Personalize conforme a automação Workato."
+
+# corpo JSON da resposta a um trigger vazio (pings/health checks): serializado 1x
+_EMPTY_TRIGGER_BODY = None
+
+
+def _empty_trigger() -> Response:
+    global _EMPTY_TRIGGER_BODY
+    if _EMPTY_TRIGGER_BODY is None:
+        _EMPTY_TRIGGER_BODY = jsonify({
+            "ok": True,
+            "received_event": "none",
+            "payload_echo": {},
+            "note": TRIGGER_NOTE,
+        }).get_data()
+    return Response(_EMPTY_TRIGGER_BODY, mimetype="application/json")
+
+
 @workato_bp.post("/trigger")
 def trigger():
     """
     Exemplo de endpoint que o Workato pode chamar.
     Aceita JSON e retorna dados simulados.
     """
-    data = request.get_json(silent=True) or {}
+    data = json_body()
+    if not data:
+        # sem corpo/corpo vazio: resposta fixa, sem montar nem serializar nada
+        current_app.logger.info("[WORKATO] evento recebido: none - {}")
+        return _empty_trigger()
     event = data.get("event", "none")
     payload = data.get("payload", {})
 
-    # log opcional no console do servidor
-    current_app.logger.info(f"[WORKATO] evento recebido: {event} - {payload}")
+    # log opcional no console do servidor (formatado só se INFO estiver ativo)
+    current_app.logger.info("[WORKATO] evento recebido: %s - %s", event, payload)
 
     return jsonify({
         "ok": True,
         "received_event": event,
         "payload_echo": payload,
-        "note": "Este endpoint é um exemplo. Personalize conforme a automação Workato."
+        "note": TRIGGER_NOTE,
     }), 200
 
 
@@ -57,11 +84,13 @@ def secure_trigger():
     Endpoint protegido com token simples.
     Configure a variável de ambiente WORKATO_API_KEY.
     """
-    api_key = current_app.config.get("WORKATO_API_KEY") or os.getenv("WORKATO_API_KEY")
-    provided = request.headers.get("X-API-Key")
+    # lida a cada request (lookup em dict): trocar a chave no config vale na hora
+    api_key = current_app.config.get("WORKATO_API_KEY")
+    provided = request.headers.get("X-API-Key") or ""
 
-    if not api_key or provided != api_key:
+    # compare_digest: tempo constante (não revela o prefixo certo da chave)
+    if not api_key or not hmac.compare_digest(provided.encode(), api_key.encode()):
         return jsonify({"ok": False, "error": "Chave de API inválida"}), 401
 
-    data = request.get_json(silent=True) or {}
+    data = json_body() or {}
     return jsonify({"ok": True, "received": data, "status": "Authorized"}), 200
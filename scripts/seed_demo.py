@@ -1,18 +1,28 @@
 import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
+from sqlalchemy import insert, select
 from app import create_app
 from models import db, Matricula
 
+# Matrículas de teste (acrescente linhas aqui; todas vão num único INSERT)
+DEMO_MATRICULAS = [
+    {"code": "MR25684", "holder_name": "Ana Silva", "cpf": "10688046967", "status": "active"},
+]
+
 app = create_app()
 
 with app.app_context():
-    code = "MR25684"
-    existing = Matricula.query.filter_by(code=code).first()
-    if existing:
+    # 1 SELECT para todos os códigos em vez de 1 por linha
+    codes = [r["code"] for r in DEMO_MATRICULAS]
+    existing = set(db.session.scalars(select(Matricula.code).where(Matricula.code.in_(codes))))
+    for code in sorted(existing):
         print(f"⚠️ Matrícula {code} já existe, ignorando inserção.")
-    else:
-        m = Matricula(code=code, holder_name="Ana Silva", cpf="10688046967", status="active")
-        db.session.add(m)
+
+    rows = [r for r in DEMO_MATRICULAS if r["code"] not in existing]
+    if rows:
+        # executemany sem instanciar objetos ORM; 1 commit para o lote
+        db.session.execute(insert(Matricula), rows)
         db.session.commit()
-        print(f"✅ Matrícula de teste criada: {m.code}")
\ No newline at end of file
+        for r in rows:
+            print(f"✅ Matrícula de teste criada: {r['code']}")
@@ -1,32 +1,29 @@
 import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from sqlalchemy import text
+from sqlalchemy import inspect, text
 from app import create_app
 from models import db
 
+# coluna -> DDL (só roda se a coluna ainda não existir)
+NOVAS_COLUNAS = {
+    "cpf": "ALTER TABLE matriculas ADD COLUMN cpf VARCHAR(14)",
+    "holder_name": "ALTER TABLE matriculas ADD COLUMN holder_name VARCHAR(120)",
+}
+
 app = create_app()
 
 with app.app_context():
-    conn = db.engine.connect()
-    try:
-        # Cria colunas se não existirem
-        conn.execute(text("ALTER TABLE matriculas ADD COLUMN cpf VARCHAR(14)"))
-        print("✅ Coluna 'cpf' adicionada.")
-    except Exception as e:
-        if "duplicate column name" in str(e) or "already exists" in str(e).lower():
-            print("⚠️  Coluna 'cpf' já existe, ignorando.")
-        else:
-            raise
-
-    try:
-        conn.execute(text("ALTER TABLE matriculas ADD COLUMN holder_name VARCHAR(120)"))
-        print("✅ Coluna 'holder_name' adicionada.")
-    except Exception as e:
-        if "duplicate column name" in str(e) or "already exists" in str(e).lower():
-            print("⚠️  Coluna 'holder_name' já existe, ignorando.")
-        else:
-            raise
+    # 1 transação para todos os ALTERs (commit no fim do bloco)
+    with db.engine.begin() as conn:
+        # Lê o esquema 1x em vez de tentar o ALTER e interpretar a mensagem de erro
+        # (texto muda entre SQLite e Postgres)
+        existentes = {c["name"] for c in inspect(conn).get_columns("matriculas")}
+        for coluna, ddl in NOVAS_COLUNAS.items():
+            if coluna in existentes:
+                print(f"⚠️  Coluna '{coluna}' já existe, ignorando.")
+                continue
+            conn.execute(text(ddl))
+            print(f"✅ Coluna '{coluna}' adicionada.")
 
-    conn.close()
-    print("🚀 Migração concluída com sucesso.")
\ No newline at end of file
+    print("🚀 Migração concluída com sucesso.")
@@ -1,17 +1,21 @@
 # seed.py
+from sqlalchemy import insert
 from app import create_app
 from models import db, Matricula
 
 app = create_app()
 
+# matrículas de exemplo (inseridas num único INSERT)
+MATRICULAS = [
+    {"code": "MR25684", "holder_name": "Ana Silva", "cpf": "10688046967", "status": "active"},
+]
+
 with app.app_context():
     # cria as tabelas (se ainda não existirem)
     db.create_all()
 
-    # cria uma matrícula de exemplo
-    m = Matricula(code="MR25684", holder_name="Ana Silva", status="active")
-
-    db.session.add(m)
+    # executemany sem instanciar objetos ORM + 1 commit para o lote
+    db.session.execute(insert(Matricula), MATRICULAS)
     db.session.commit()
 
-    print("✅ Matrícula criada com sucesso:", m.code)
\ No newline at end of file
+    print("✅ Matrículas criadas com sucesso:", ", ".join(m["code"] for m in MATRICULAS))
@@ -0,0 +1,6 @@
+# tests/conftest.py
+# Raiz do projeto no sys.path (models.py, app.py e modules/ ficam lá)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
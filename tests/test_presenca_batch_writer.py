@@ -0,0 +1,62 @@
+# tests/test_presenca_batch_writer.py
+import datetime as dt
+import time
+
+import pytest
+from flask import Flask
+
+from models import db, Presenca
+from modules.presenca.tasks import PresencaBatchWriter
+
+HOJE = dt.date(2026, 10, 16)
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    yield app
+
+
+def _row(matricula_id: int) -> dict:
+    # id explícito: BIGINT no SQLite não é autoincremento
+    return {
+        "id": matricula_id,
+        "matricula_id": matricula_id,
+        "date_key": HOJE,
+        "timestamp": dt.datetime(2026, 10, 16, 12, 0, tzinfo=dt.UTC),
+        "ip": "127.0.0.1",
+        "user_agent": "pytest",
+        "source": "web",
+    }
+
+
+def _presencas(app) -> int:
+    with app.app_context():
+        return db.session.query(Presenca).filter_by(date_key=HOJE).count()
+
+
+def test_lote_com_falha_libera_a_chave_para_nova_gravacao(app, monkeypatch):
+    writer = PresencaBatchWriter(app, max_wait=0.01)
+
+    def _falha(*args, **kwargs):
+        raise RuntimeError("banco indisponível")
+
+    # 1ª gravação falha: a chave aceita não pode ficar presa no conjunto do dia
+    writer.remember(7, HOJE)
+    with monkeypatch.context() as m:
+        m.setattr(db.session, "execute", _falha)
+        writer._write([_row(7)])
+    assert not writer.seen(7, HOJE)
+    assert _presencas(app) == 0
+
+    # nova request da mesma matrícula no dia é aceita e gravada pela thread
+    assert writer.submit(_row(7))
+    deadline = time.monotonic() + 5
+    while _presencas(app) == 0 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert _presencas(app) == 1
+    assert writer.seen(7, HOJE)
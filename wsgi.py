@@ -1,4 +1,7 @@
 # wsgi.py
+# Produção (Procfile): gunicorn wsgi:app --preload --workers N --threads 8
+# --preload cria a app 1x no master (imports de pandas/numpy/orjson incluídos);
+# os workers nascem por fork e compartilham essas páginas de memória.
 from app import create_app
 
 # chama a função que cria a instância da aplicação Flask